@@ -0,0 +1,241 @@
+import argparse
+import json
+import os
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from booking_data import CSV_PATH, SNAPSHOT_DIR, shared_dir
+
+# Headless benchmark for the British Airways dashboard pipeline.
+#
+#   python bench_dashboard.py --rows 50000,500000,5000000 --output bench.json
+#   python bench_dashboard.py --rows 50000 --baseline bench.json   # exit 1 on regression
+#
+# Each scale runs in its own process on synthetic bookings drawn from the
+# per-column distributions of customer_booking.csv. It reports load time, the
+# time and peak traced memory of each panel's compute step, the peak RSS of
+# the process, and the serialized size of every chart the dashboards render
+# (via Streamlit's AppTest harness). Timings are the fastest of --repeats runs
+# (the median is reported alongside); peak memory comes from one extra traced run.
+
+SCALES = [50_000, 500_000, 5_000_000]
+TIMING_REPEATS = 5
+DASHBOARDS = ['dashboard_british.py', 'british3.py']
+GENERATE_CHUNK_ROWS = 1_000_000
+# Regressions smaller than this are treated as noise whatever the tolerance
+MIN_SECONDS_DELTA = 0.05
+MIN_BYTES_DELTA = 4096
+
+
+# --- Synthetic data ---
+# Columns are sampled independently from their observed value frequencies, so
+# each marginal distribution (and the schema) matches the real export.
+def synthesize_bookings(rows, path, source=CSV_PATH, seed=0):
+    raw = pd.read_csv(source, encoding='latin1')
+    marginals = {col: raw[col].value_counts(dropna=False, normalize=True) for col in raw.columns}
+    rng = np.random.default_rng(seed)
+    written = 0
+    with open(path, 'w', encoding='latin1', newline='') as f:
+        while written < rows:
+            n = min(GENERATE_CHUNK_ROWS, rows - written)
+            chunk = pd.DataFrame({
+                col: freq.index.to_numpy()[rng.choice(len(freq), size=n, p=freq.to_numpy())]
+                for col, freq in marginals.items()
+            })
+            chunk.to_csv(f, header=written == 0, index=False)
+            written += n
+    return path
+
+
+# --- Measurements ---
+def measure(step, repeats=TIMING_REPEATS, setup=None):
+    # Timed runs and the memory run are separate: tracemalloc hooks every
+    # allocation and would slow the timed code down. setup() runs untimed
+    # before each run (e.g. to make every load a cold one).
+    times = []
+    for _ in range(repeats):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        result = step()
+        times.append(time.perf_counter() - start)
+    if setup:
+        setup()
+    tracemalloc.start()
+    try:
+        step()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return result, {'seconds': round(min(times), 6), 'median_seconds': round(statistics.median(times), 6),
+                    'peak_bytes': peak}
+
+
+def clear_snapshots():
+    for path in [SNAPSHOT_DIR, shared_dir()]:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def compute_steps(store):
+    # The work behind each panel, as the dashboards do it on a cache miss
+    from booking_aggregates import (cube_counts, cube_kpis, counts_histogram, counts_box_summary,
+                                    binned_scatter, stratified_sample, RankCodes, CompletionDrilldown)
+    from booking_index import BookingIndex
+    from booking_query import make_engine
+
+    df, cube = store.df, store.cube
+    numeric = df.select_dtypes(include=[np.number]).columns.tolist()
+    # Unfiltered queries only, so the engine never needs a filter mask
+    engine = make_engine('pandas', df=df, cube=cube, corr=store.corr, mask=None)
+    return {
+        'kpis': lambda: cube_kpis(cube),
+        'route_counts': lambda: cube_counts(cube, 'route'),
+        'map': lambda: cube_counts(cube, 'booking_origin'),
+        'day': lambda: cube_counts(cube, 'flight_day', sort=False),
+        'histogram': lambda: [counts_histogram(engine.value_counts(c), nbins=30) for c in numeric],
+        'scatter_density': lambda: binned_scatter(df, 'purchase_lead', 'length_of_stay'),
+        'scatter_sample': lambda: stratified_sample(df, 'booking_status', 5000),
+        'heatmap_pearson': lambda: store.corr.matrix(),
+        'heatmap_spearman': lambda: RankCodes(df, numeric).matrix(),
+        'box': lambda: [counts_box_summary(engine.value_counts(c)) for c in numeric],
+        'filter_index': lambda: BookingIndex(df),
+        'drilldown': lambda: CompletionDrilldown(df).table(('route', 'booking_origin', 'flight_hour')),
+    }
+
+
+def chart_sizes(path, script, timeout):
+    from streamlit.testing.v1 import AppTest
+
+    os.environ['BOOKING_SOURCE'] = path
+    app = AppTest.from_file(os.path.abspath(script), default_timeout=timeout)
+    start = time.perf_counter()
+    app.run()
+    cold = time.perf_counter() - start
+    start = time.perf_counter()
+    app.run()
+    warm = time.perf_counter() - start
+    charts = []
+    for chart in app.get('plotly_chart'):
+        spec = chart.proto.spec
+        title = json.loads(spec).get('layout', {}).get('title', {}).get('text')
+        charts.append({'title': title, 'bytes': len(spec)})
+    return {
+        'run_seconds': round(cold, 6),
+        'rerun_seconds': round(warm, 6),
+        'exceptions': [e.value for e in app.exception],
+        'charts': charts,
+    }
+
+
+def run_scale(rows, timeout, repeats=TIMING_REPEATS):
+    from booking_store import BookingStore
+
+    repo = os.path.dirname(os.path.abspath(__file__))
+    workdir = tempfile.mkdtemp(prefix='booking-bench-')
+    try:
+        path = synthesize_bookings(rows, os.path.join(workdir, 'bookings.csv'),
+                                   source=os.path.join(repo, CSV_PATH))
+        # Snapshots and the shared store are written relative to the working
+        # directory; keep them out of the repo's own cache
+        os.chdir(workdir)
+        store, load_cold = measure(lambda: BookingStore(path), repeats, setup=clear_snapshots)
+        _, load_attach = measure(lambda: BookingStore(path), repeats)
+        panels = {name: measure(step, repeats)[1] for name, step in compute_steps(store).items()}
+        dashboards = {script: chart_sizes(path, os.path.join(repo, script), timeout) for script in DASHBOARDS}
+        return {
+            'rows': rows,
+            'loaded_rows': len(store.df),
+            'load': {'cold': load_cold, 'attach': load_attach},
+            'panels': panels,
+            'dashboards': dashboards,
+            'max_rss_bytes': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+        }
+    finally:
+        os.chdir(repo)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+# --- Regression check ---
+def _metrics(results):
+    # Flat {name: value} of every timing and size, for comparing two runs
+    flat = {}
+    for scale in results['scales']:
+        prefix = f"{scale['rows']}"
+        for kind, m in scale['load'].items():
+            flat[f'{prefix}/load/{kind}/seconds'] = m['seconds']
+        for name, m in scale['panels'].items():
+            flat[f'{prefix}/panel/{name}/seconds'] = m['seconds']
+            flat[f'{prefix}/panel/{name}/peak_bytes'] = m['peak_bytes']
+        for script, app in scale['dashboards'].items():
+            flat[f'{prefix}/{script}/rerun_seconds'] = app['rerun_seconds']
+            for i, chart in enumerate(app['charts']):
+                flat[f"{prefix}/{script}/chart{i}:{chart['title']}/bytes"] = chart['bytes']
+    return flat
+
+
+def regressions(results, baseline, tolerance):
+    new, old = _metrics(results), _metrics(baseline)
+    found = []
+    for name, value in new.items():
+        if name not in old:
+            continue
+        floor = MIN_SECONDS_DELTA if name.endswith('seconds') else MIN_BYTES_DELTA
+        if value > old[name] * (1 + tolerance) and value - old[name] > floor:
+            found.append({'metric': name, 'baseline': old[name], 'value': value})
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the booking dashboard pipeline.')
+    parser.add_argument('--rows', default=','.join(map(str, SCALES)),
+                        help='comma-separated booking counts, e.g. 50000,50000000')
+    parser.add_argument('--output', help='write JSON here instead of stdout')
+    parser.add_argument('--baseline', help='previous JSON output to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='allowed relative slowdown/growth before a metric counts as a regression')
+    parser.add_argument('--timeout', type=float, default=600, help='AppTest timeout per run (seconds)')
+    parser.add_argument('--repeats', type=int, default=TIMING_REPEATS,
+                        help='timed runs per step; the fastest is reported')
+    parser.add_argument('--scale', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.scale is not None:
+        # Child process: one scale, so peak RSS belongs to that scale alone
+        # (last line of stdout; anything the apps print comes before it)
+        print(json.dumps(run_scale(args.scale, args.timeout, args.repeats)))
+        return 0
+
+    scales = []
+    for rows in (int(r) for r in args.rows.split(',')):
+        child = subprocess.run([sys.executable, os.path.abspath(__file__), '--scale', str(rows),
+                                '--timeout', str(args.timeout), '--repeats', str(args.repeats)],
+                               capture_output=True, text=True, check=True)
+        scales.append(json.loads(child.stdout.strip().splitlines()[-1]))
+    results = {'python': sys.version.split()[0], 'pandas': pd.__version__, 'scales': scales}
+
+    status = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            results['regressions'] = regressions(results, json.load(f), args.tolerance)
+        status = 1 if results['regressions'] else 0
+
+    text = json.dumps(results, indent=1)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+    else:
+        print(text)
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
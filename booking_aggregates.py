@@ -0,0 +1,434 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from booking_data import concat_bookings
+
+# Precomputed aggregates for the British Airways dashboards. Everything here
+# works on small summary frames so the panels don't rescan the booking rows.
+
+CUBE_DIMENSIONS = ['route', 'booking_origin', 'flight_day', 'flight_hour', 'sales_channel', 'trip_type']
+
+
+# --- Aggregate cube ---
+# One row per observed combination of CUBE_DIMENSIONS with booking counts,
+# completions and the extras needed by the KPI tiles. first_row keeps the
+# position of the earliest booking so ties resolve like idxmax/idxmin on the frame.
+def build_cube(df, row_offset=0):
+    cube = (
+        df.assign(
+            _row=np.arange(row_offset, row_offset + len(df)),
+            # Widen before summing: the frame stores these as int8
+            _completed=df['booking_complete'].astype('int64'),
+            _passengers=df['num_passengers'].astype('int64'),
+        )
+        .groupby(CUBE_DIMENSIONS, observed=True, dropna=False)
+        .agg(
+            bookings=('_row', 'size'),
+            completed=('_completed', 'sum'),
+            passengers=('_passengers', 'sum'),
+            duration_min=('flight_duration', 'min'),
+            duration_max=('flight_duration', 'max'),
+            first_row=('_row', 'min'),
+        )
+        .reset_index()
+    )
+    return cube
+
+
+def merge_cubes(cube, delta_cube):
+    # Folds the cube of newly ingested rows into an existing one; cost depends
+    # on the number of cells, not on the number of bookings behind them
+    return (
+        concat_bookings([cube, delta_cube], ignore_index=True)
+        .groupby(CUBE_DIMENSIONS, observed=True, dropna=False)
+        .agg(
+            bookings=('bookings', 'sum'),
+            completed=('completed', 'sum'),
+            passengers=('passengers', 'sum'),
+            duration_min=('duration_min', 'min'),
+            duration_max=('duration_max', 'max'),
+            first_row=('first_row', 'min'),
+        )
+        .reset_index()
+    )
+
+
+def cube_counts(cube, dim, sort=True):
+    # Same shape as df[dim].value_counts(); sort=False keeps the category order
+    counts = cube.groupby(dim, observed=True)['bookings'].sum().rename('count')
+    if sort:
+        counts = counts.sort_values(ascending=False, kind='stable')
+    return counts
+
+
+def cube_where(cube, filters):
+    # Cells matching the sidebar filters ((column, values) pairs over CUBE_DIMENSIONS)
+    keep = np.ones(len(cube), dtype=bool)
+    for col, values in filters:
+        keep &= cube[col].isin(values).to_numpy()
+    return cube[keep]
+
+
+def _extreme_route(cube, column, pick_max):
+    if cube.empty:
+        return float('nan'), None
+    target = cube[column].max() if pick_max else cube[column].min()
+    cells = cube[cube[column] == target]
+    return target, cells.loc[cells['first_row'].idxmin(), 'route']
+
+
+def cube_kpis(cube):
+    total = int(cube['bookings'].sum())
+    route_counts = cube_counts(cube, 'route')
+    longest_duration, longest_route = _extreme_route(cube, 'duration_max', pick_max=True)
+    shortest_duration, shortest_route = _extreme_route(cube, 'duration_min', pick_max=False)
+    return {
+        'total_bookings': total,
+        'completion_rate': cube['completed'].sum() / total * 100 if total else float('nan'),
+        'avg_passengers': cube['passengers'].sum() / total if total else float('nan'),
+        'most_travelled_route': route_counts.index[0] if total else None,
+        'route_count': int(route_counts.iloc[0]) if total else 0,
+        'longest_flight_duration': longest_duration,
+        'longest_route': longest_route,
+        'shortest_flight_duration': shortest_duration,
+        'shortest_route': shortest_route,
+    }
+
+
+# --- Binned scatter ---
+# Density mode for the scatter panels: points are counted into a grid per
+# booking status so the figure carries one marker per occupied cell.
+def bin_edges(values, max_bins):
+    values = values[np.isfinite(values)]
+    if values.size == 0:
+        return np.array([0.0, 1.0])
+    lo, hi = values.min(), values.max()
+    # Small integer ranges (flags, flight_hour, num_passengers) get one bin per value
+    if np.all(values == np.round(values)) and hi - lo + 1 <= max_bins:
+        return np.arange(lo - 0.5, hi + 1.5)
+    if lo == hi:
+        return np.array([lo - 0.5, hi + 0.5])
+    return np.linspace(lo, hi, max_bins + 1)
+
+
+def _bin_index(values, edges):
+    return np.clip(np.searchsorted(edges, values, side='right') - 1, 0, len(edges) - 2)
+
+
+def scatter_cell_counts(df, x, y, x_edges, y_edges, by='booking_status', labels=None, weights=None):
+    # Flat bincount over (group, x bin, y bin); chunks binned against the same
+    # edges and labels can simply be summed. weights names a count column when
+    # df holds distinct (by, x, y) combinations rather than bookings.
+    xv = df[x].to_numpy(dtype=float)
+    yv = df[y].to_numpy(dtype=float)
+    codes = pd.Categorical(df[by], categories=labels).codes
+    keep = np.isfinite(xv) & np.isfinite(yv) & (codes >= 0)
+    nx, ny = len(x_edges) - 1, len(y_edges) - 1
+    cell = (codes[keep].astype(np.int64) * nx + _bin_index(xv[keep], x_edges)) * ny + _bin_index(yv[keep], y_edges)
+    w = None if weights is None else df[weights].to_numpy()[keep]
+    return np.bincount(cell, weights=w, minlength=len(labels) * nx * ny).astype(np.int64)
+
+
+def scatter_cells(counts, x, y, x_edges, y_edges, by='booking_status', labels=None):
+    nx, ny = len(x_edges) - 1, len(y_edges) - 1
+    occupied = np.flatnonzero(counts)
+    group, rest = np.divmod(occupied, nx * ny)
+    ix, iy = np.divmod(rest, ny)
+    x_centers = (x_edges[:-1] + x_edges[1:]) / 2
+    y_centers = (y_edges[:-1] + y_edges[1:]) / 2
+    return pd.DataFrame({
+        x: x_centers[ix],
+        y: y_centers[iy],
+        by: np.asarray(labels)[group],
+        'count': counts[occupied],
+    })
+
+
+def binned_scatter(df, x, y, by='booking_status', max_bins=60, weights=None):
+    labels = np.sort(df[by].dropna().unique())
+    x_edges = bin_edges(df[x].to_numpy(dtype=float), max_bins)
+    y_edges = bin_edges(df[y].to_numpy(dtype=float), max_bins)
+    counts = scatter_cell_counts(df, x, y, x_edges, y_edges, by, labels, weights)
+    return scatter_cells(counts, x, y, x_edges, y_edges, by, labels)
+
+
+def stratified_sample(df, by, n, random_state=0):
+    # Proportional sample that keeps the mix of each group in `by`
+    if len(df) <= n:
+        return df
+    return df.groupby(by, observed=True, group_keys=False).sample(frac=n / len(df), random_state=random_state)
+
+
+# --- Histogram and box-plot summaries ---
+# The distribution panels plot these small frames instead of handing Plotly
+# the raw column to bin / compute quartiles in the browser.
+def histogram_bins(values, nbins=30, weights=None):
+    # weights lets callers pass distinct values with their counts instead of raw rows
+    values = np.asarray(values, dtype=float)
+    keep = np.isfinite(values)
+    values = values[keep]
+    if weights is not None:
+        weights = np.asarray(weights)[keep]
+    counts, edges = np.histogram(values, bins=bin_edges(values, nbins), weights=weights)
+    return pd.DataFrame({
+        'bin_center': (edges[:-1] + edges[1:]) / 2,
+        'bin_start': edges[:-1],
+        'bin_end': edges[1:],
+        'count': counts.astype(np.int64),
+    })
+
+
+def _weighted_percentile(values, counts, q):
+    # np.percentile's linear method on data given as sorted distinct values + counts
+    cum = np.cumsum(counts)
+    h = (cum[-1] - 1) * q / 100
+    lo = np.floor(h)
+    v_lo = values[np.searchsorted(cum, lo, side='right')]
+    v_hi = values[np.searchsorted(cum, min(lo + 1, cum[-1] - 1), side='right')]
+    return v_lo + (h - lo) * (v_hi - v_lo)
+
+
+def box_stats(values, counts):
+    # Five-number summary using Plotly's defaults: linear quartiles, whiskers at
+    # the furthest points within 1.5 IQR, distinct outlier values. Takes sorted
+    # distinct values with their counts so streamed sketches can use it too.
+    q1, median, q3 = (_weighted_percentile(values, counts, q) for q in (25, 50, 75))
+    low, high = q1 - 1.5 * (q3 - q1), q3 + 1.5 * (q3 - q1)
+    inside = values[(values >= low) & (values <= high)]
+    return {
+        'count': int(counts.sum()),
+        'mean': float((values * counts).sum() / counts.sum()),
+        'q1': q1,
+        'median': median,
+        'q3': q3,
+        'lowerfence': inside.min(),
+        'upperfence': inside.max(),
+        'outliers': values[(values < low) | (values > high)],
+    }
+
+
+# Value counts as a Series indexed by (status, value), the shape kept by the
+# streamed sketches and returned by the query engines (booking_query.py)
+def counts_histogram(counts, nbins=30):
+    totals = counts.groupby(level=1).sum()
+    return histogram_bins(totals.index.to_numpy(dtype=float), nbins, weights=totals.to_numpy())
+
+
+def counts_box_summary(counts, by='booking_status'):
+    rows = []
+    for label, part in counts.groupby(level=0):
+        part = part.droplevel(0).sort_index()
+        part = part[np.isfinite(part.index.to_numpy(dtype=float)) & (part.to_numpy() > 0)]
+        if part.empty:
+            continue
+        rows.append({by: label, **box_stats(part.index.to_numpy(dtype=float), part.to_numpy())})
+    return pd.DataFrame(rows)
+
+
+def box_summary(df, col, by='booking_status'):
+    rows = []
+    for label, values in df.groupby(by, observed=True)[col]:
+        v = values.to_numpy(dtype=float)
+        v = v[np.isfinite(v)]
+        if v.size == 0:
+            continue
+        distinct, counts = np.unique(v, return_counts=True)
+        rows.append({by: label, **box_stats(distinct, counts)})
+    return pd.DataFrame(rows)
+
+
+# --- Correlation ---
+# Running sums behind the correlation heatmap: count, column sums and the
+# cross-product matrix, accumulated around a fixed shift for numerical stability.
+# With `by`, the sums are kept per combination of those columns so the matrix
+# of any filtered subset is the sum of the matching cells, no rescan needed.
+CORR_DIMENSIONS = ['sales_channel', 'trip_type', 'flight_day', 'booking_status']
+
+
+class CorrelationSums:
+    def __init__(self, columns, by=()):
+        self.columns = list(columns)
+        self.by = list(by)
+        self.shift = None
+        # key (tuple of `by` values) -> [n, sums, cross]
+        self.cells = {}
+
+    def copy(self):
+        other = CorrelationSums(self.columns, self.by)
+        other.shift = self.shift
+        other.cells = {key: [n, sums.copy(), cross.copy()] for key, (n, sums, cross) in self.cells.items()}
+        return other
+
+    def update(self, frame):
+        x = frame[self.columns].to_numpy(dtype=float)
+        keep = np.isfinite(x).all(axis=1)
+        x = x[keep]
+        if not len(x):
+            return self
+        if self.shift is None:
+            self.shift = x.mean(axis=0)
+        x = x - self.shift
+        if self.by:
+            keys = frame.loc[keep, self.by].reset_index(drop=True)
+            groups = keys.groupby(self.by, observed=True, dropna=False).indices
+        else:
+            groups = {(): slice(None)}
+        for key, rows in groups.items():
+            part = x[rows]
+            cell = self.cells.setdefault(key, [0, np.zeros(len(self.columns)),
+                                               np.zeros((len(self.columns), len(self.columns)))])
+            cell[0] += len(part)
+            cell[1] += part.sum(axis=0)
+            cell[2] += part.T @ part
+        return self
+
+    def _selected(self, where):
+        # where: {dimension: allowed values}; dimensions left out are unfiltered
+        where = where or {}
+        positions = [(self.by.index(dim), set(values)) for dim, values in where.items()]
+        for key, cell in self.cells.items():
+            if all(key[i] in allowed for i, allowed in positions):
+                yield cell
+
+    def matrix(self, where=None):
+        n, sums, cross = 0, np.zeros(len(self.columns)), np.zeros((len(self.columns), len(self.columns)))
+        for cell_n, cell_sums, cell_cross in self._selected(where):
+            n += cell_n
+            sums = sums + cell_sums
+            cross = cross + cell_cross
+        mean = sums / max(n, 1)
+        cov = cross / max(n, 1) - np.outer(mean, mean)
+        std = np.sqrt(np.clip(np.diag(cov), 0, None))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            corr = cov / np.outer(std, std)
+        # Constant columns have no defined correlation, like DataFrame.corr()
+        corr[std == 0, :] = np.nan
+        corr[:, std == 0] = np.nan
+        return pd.DataFrame(corr, index=self.columns, columns=self.columns)
+
+
+def midrank_table(counts):
+    # Average rank of each distinct value given how often each one occurs
+    # (ties share the mean of their positions, like DataFrame.rank())
+    counts = np.asarray(counts)
+    return np.cumsum(counts) - (counts - 1) / 2
+
+
+# Cached ranking for Spearman correlation: each column is stored once as codes
+# into its sorted distinct values. Ranks for any subset come from a bincount of
+# the codes, so switching method or filter never sorts the frame again.
+class RankCodes:
+    def __init__(self, df, columns):
+        self.columns = list(columns)
+        self.codes = np.empty((len(df), len(self.columns)), dtype=np.int32)
+        self.sizes = []
+        for j, col in enumerate(self.columns):
+            values = df[col].to_numpy(dtype=float)
+            distinct, codes = np.unique(values, return_inverse=True)
+            codes[~np.isfinite(values)] = -1
+            self.codes[:, j] = codes
+            self.sizes.append(len(distinct))
+        self.complete = (self.codes >= 0).all(axis=1)
+
+    def matrix(self, mask=None):
+        keep = self.complete if mask is None else self.complete & np.asarray(mask, dtype=bool)
+        codes = self.codes[keep]
+        ranks = np.empty(codes.shape)
+        for j, size in enumerate(self.sizes):
+            ranks[:, j] = midrank_table(np.bincount(codes[:, j], minlength=size))[codes[:, j]]
+        return CorrelationSums(self.columns).update(pd.DataFrame(ranks, columns=self.columns)).matrix()
+
+
+# --- Completion drilldown ---
+# Completion rate and volume by any combination of booking dimensions. Each
+# dimension is stored once as small integer codes; a combination's groups are
+# mixed-radix codes over them (with the booking outcome as the last digit), so
+# both measures come from one bincount and changing the combination or the
+# filter never groups the frame again.
+DRILLDOWN_DIMENSIONS = ['route', 'booking_origin', 'sales_channel', 'trip_type', 'flight_day', 'flight_hour',
+                        'wants_extra_baggage', 'wants_preferred_seat', 'wants_in_flight_meals']
+# Combinations with up to this many possible cells (and no more than there are
+# rows) are counted directly; wider ones are first compacted to the cells that occur
+DRILLDOWN_DENSE_CELLS = 1 << 22
+# Group codes kept for the most recently used combinations (one array per row each)
+DRILLDOWN_MEMO = 8
+
+
+class CompletionDrilldown:
+    def __init__(self, df, dimensions=DRILLDOWN_DIMENSIONS, bookings=None, completed='booking_complete'):
+        # bookings/completed name count columns when df is already aggregated
+        # (e.g. the cube); by default every row is one booking and completed its 0/1 outcome
+        self.dimensions = list(dimensions)
+        self.rows = len(df)
+        self.codes = {}
+        self.labels = {}
+        for dim in self.dimensions:
+            codes, uniques = pd.factorize(df[dim], sort=True, use_na_sentinel=False)
+            self.codes[dim] = codes.astype(np.min_scalar_type(max(len(uniques) - 1, 0)))
+            self.labels[dim] = pd.Index(uniques, name=dim)
+        if bookings is None:
+            self.outcome = (df[completed].to_numpy() != 0).astype(np.uint8)
+            self.weights = None
+        else:
+            self.outcome = None
+            self.weights = (df[bookings].to_numpy(dtype=np.int64), df[completed].to_numpy(dtype=np.int64))
+        self._groups = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _group_codes(self, dims):
+        with self._lock:
+            if dims in self._groups:
+                self._groups.move_to_end(dims)
+                return self._groups[dims]
+        sizes = [len(self.labels[dim]) for dim in dims]
+        radix = sizes if self.outcome is None else sizes + [2]
+        digits = [self.codes[dim] for dim in dims] + ([] if self.outcome is None else [self.outcome])
+        combined = np.zeros(self.rows, dtype=np.int64)
+        for digit, size in zip(digits, radix):
+            combined = combined * size + digit
+        n_cells = int(np.prod(radix, dtype=np.int64))
+        if n_cells <= min(DRILLDOWN_DENSE_CELLS, self.rows):
+            cells, group = np.arange(n_cells), combined
+        else:
+            group, cells = pd.factorize(combined)
+        group = group.astype(np.min_scalar_type(max(len(cells) - 1, 0)))
+        with self._lock:
+            self._groups[dims] = (group, cells, sizes)
+            while len(self._groups) > DRILLDOWN_MEMO:
+                self._groups.popitem(last=False)
+        return group, cells, sizes
+
+    def table(self, dims, mask=None):
+        # One row per occurring combination of dims, largest volume first
+        dims = tuple(dims)
+        group, cells, sizes = self._group_codes(dims)
+        if mask is not None:
+            mask = np.asarray(mask, dtype=bool)
+            group = group[mask]
+        if self.outcome is None:
+            bookings, completed = (w if mask is None else w[mask] for w in self.weights)
+            volume = np.bincount(group, weights=bookings, minlength=len(cells))
+            done = np.bincount(group, weights=completed, minlength=len(cells))
+            keys = cells
+        else:
+            volume = np.bincount(group, minlength=len(cells))
+            done = volume * (cells % 2)
+            keys = cells // 2
+        # Fold the per-cell counts (outcome digit dropped) onto one row per combination
+        occupied = volume > 0
+        keys, slot = np.unique(keys[occupied], return_inverse=True)
+        volume = np.bincount(slot, weights=volume[occupied], minlength=len(keys)).astype(np.int64)
+        done = np.bincount(slot, weights=done[occupied], minlength=len(keys)).astype(np.int64)
+        # Decode the mixed-radix keys back into one label per dimension
+        columns = {}
+        for dim, size in zip(reversed(dims), reversed(sizes)):
+            columns[dim] = self.labels[dim].take(keys % size)
+            keys = keys // size
+        table = pd.DataFrame({dim: columns[dim] for dim in dims})
+        table['bookings'] = volume
+        table['completed'] = done
+        table['completion_rate'] = table['completed'] / table['bookings'] * 100
+        return table.sort_values('bookings', ascending=False, kind='stable', ignore_index=True)
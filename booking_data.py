@@ -0,0 +1,625 @@
+import contextlib
+import errno
+import glob
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import pickle
+import shutil
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+import numpy as np
+import pandas as pd
+
+# Shared data loading for the British Airways dashboards
+# (dashboard_british.py and british3.py)
+
+CSV_PATH = 'customer_booking.csv'
+SNAPSHOT_DIR = '.booking_cache'
+# Bump whenever the cleaning/derivation steps below change so stale snapshots are rebuilt
+SNAPSHOT_VERSION = 5
+# Directory of extra booking CSVs (same header as the main export) folded in incrementally
+BATCH_DIR = 'booking_batches'
+# Bytes before the last ingested offset that must be unchanged for growth to count as an append
+TAIL_WINDOW = 64 * 1024
+
+DAY_ORDER = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+# Raw CSV columns that are always parsed as text, even in a partition where they look numeric
+TEXT_COLUMNS = ['sales_channel', 'trip_type', 'flight_day', 'route', 'booking_origin']
+
+# In-memory schema for the cleaned booking frame: low-cardinality text is
+# dictionary-encoded as categoricals and small-range numbers are narrowed.
+# Integer targets are only applied when the data actually fits (see apply_schema).
+BOOKING_SCHEMA = {
+    'num_passengers': 'int8',
+    'sales_channel': 'category',
+    'trip_type': 'category',
+    'purchase_lead': 'int16',
+    'length_of_stay': 'int16',
+    'flight_hour': 'int8',
+    'flight_day': pd.CategoricalDtype(DAY_ORDER, ordered=True),
+    'route': 'category',
+    'booking_origin': 'category',
+    'wants_extra_baggage': 'int8',
+    'wants_preferred_seat': 'int8',
+    'wants_in_flight_meals': 'int8',
+    'flight_duration': 'float32',
+    'booking_complete': 'int8',
+    'booking_status': 'category',
+    'has_baggage': 'category',
+    'has_preferred_seat': 'category',
+    'has_in_flight_meals': 'category',
+}
+
+
+# --- Cleaning ---
+def clean_bookings(df):
+    df['booking_status'] = df['booking_complete'].map({0: 'Incomplete', 1: 'Complete'})
+    df['has_baggage'] = df['wants_extra_baggage'].map({0: 'No', 1: 'Yes'})
+    df['has_preferred_seat'] = df['wants_preferred_seat'].map({0: 'No', 1: 'Yes'})
+    df['has_in_flight_meals'] = df['wants_in_flight_meals'].map({0: 'No', 1: 'Yes'})
+    df['flight_day'] = pd.Categorical(df['flight_day'], categories=DAY_ORDER, ordered=True)
+    # Basic data cleaning: handle outliers in lead time and stay duration
+    df = df[df['purchase_lead'] >= 0]
+    df = df[df['length_of_stay'] >= 0]
+    return apply_schema(df)
+
+
+# --- Schema ---
+def _fits(col, dtype):
+    if col.empty:
+        return True
+    info = np.iinfo(dtype)
+    return info.min <= col.min() and col.max() <= info.max
+
+
+def apply_schema(df, schema=BOOKING_SCHEMA):
+    converted = {}
+    for name, dtype in schema.items():
+        if name not in df.columns:
+            continue
+        col = df[name]
+        if isinstance(dtype, str) and dtype.startswith('int'):
+            if col.isna().any():
+                continue
+            # A future export with wider values keeps a safe integer width instead of overflowing
+            if not _fits(col, dtype):
+                converted[name] = pd.to_numeric(col, downcast='integer')
+                continue
+        converted[name] = col.astype(dtype)
+    return df.assign(**converted)
+
+
+def memory_report(df):
+    usage = df.memory_usage(deep=True, index=False)
+    report = pd.DataFrame({
+        'dtype': df.dtypes.astype(str),
+        'bytes': usage,
+        'bytes_per_row': usage / max(len(df), 1),
+    })
+    report.loc['TOTAL'] = ['', usage.sum(), usage.sum() / max(len(df), 1)]
+    return report
+
+
+def read_bookings_csv(path=CSV_PATH):
+    if is_partitioned(path):
+        return read_booking_partitions(partition_paths(path))[0]
+    df = pd.read_csv(path, encoding='latin1')
+    return clean_bookings(df)
+
+
+# --- Partitioned exports ---
+# A source can also be a directory or glob of CSVs (e.g. one per day/market)
+# sharing the customer_booking.csv header. Partitions are parsed and cleaned
+# in parallel worker processes and concatenated in sorted path order.
+def is_partitioned(source):
+    return os.path.isdir(source) or glob.has_magic(source)
+
+
+def partition_paths(source):
+    if os.path.isdir(source):
+        source = os.path.join(source, '*.csv')
+    return sorted(glob.glob(source))
+
+
+def _read_partition(path, text_columns=TEXT_COLUMNS):
+    raw = pd.read_csv(path, encoding='latin1', dtype={c: str for c in text_columns})
+    return clean_bookings(raw), len(raw)
+
+
+def read_booking_partitions(paths, text_columns=TEXT_COLUMNS, row_offset=0, max_workers=None):
+    # Returns the cleaned frame (index continues from row_offset across
+    # partitions, counting raw rows) and the offset after the last partition
+    if not paths:
+        raise FileNotFoundError('No booking partitions to read')
+    workers = min(len(paths), max_workers or os.cpu_count() or 1)
+    if workers > 1:
+        # Spawned, not forked: the dashboards call this from a thread of a
+        # multi-threaded server, and a forked worker can inherit a lock that
+        # another thread held at the time and never be able to take it
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            results = list(pool.map(_read_partition, paths, [text_columns] * len(paths)))
+    else:
+        results = [_read_partition(p, text_columns) for p in paths]
+    frames = []
+    for frame, raw_rows in results:
+        frames.append(frame.set_axis(frame.index + row_offset))
+        row_offset += raw_rows
+    return concat_bookings(frames), row_offset
+
+
+# --- Source fingerprint ---
+def file_sha256(path, start=0, end=None, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        f.seek(start)
+        remaining = (end if end is not None else os.path.getsize(path)) - start
+        while remaining > 0:
+            block = f.read(min(chunk_size, remaining))
+            if not block:
+                break
+            digest.update(block)
+            remaining -= len(block)
+    return digest.hexdigest()
+
+
+def _file_stamp(path):
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def data_version(path=CSV_PATH):
+    # Cheap per-rerun cache key: changes whenever the CSV is rewritten or appended to
+    # (or, for a partitioned source, whenever any partition is added or changed)
+    if is_partitioned(path):
+        stamps = json.dumps({p: _file_stamp(p) for p in partition_paths(path)})
+        return hashlib.sha256(stamps.encode()).hexdigest()[:16]
+    size, mtime_ns = _file_stamp(path)
+    return f'{size}-{mtime_ns}'
+
+
+def _tail_sha256(path, end):
+    return file_sha256(path, max(0, end - TAIL_WINDOW), end)
+
+
+def _ends_with_newline(path, end):
+    if end == 0:
+        return True
+    with open(path, 'rb') as f:
+        f.seek(end - 1)
+        return f.read(1) == b'\n'
+
+
+# --- Columnar snapshot ---
+# One append-only binary file per column (plus the row index). String and
+# categorical columns are stored as integer codes into a category list kept
+# in meta.json, so every file is a plain fixed-width array. Each ingest (the
+# full CSV parse, then one per delta: rows appended to the CSV or a file
+# dropped into BATCH_DIR) appends its rows to the end of every file and is
+# recorded as a segment. A version of the frame is the first N rows of each
+# file, memory-mapped without copying; earlier rows are never rewritten, so
+# readers mapping an older version are unaffected by later appends.
+# meta.json ties the segments to the source bytes.
+def read_meta(snapshot_dir):
+    try:
+        with open(os.path.join(snapshot_dir, 'meta.json')) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_meta(meta, snapshot_dir):
+    tmp_path = os.path.join(snapshot_dir, 'meta.json.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(meta, f, indent=1)
+    os.replace(tmp_path, os.path.join(snapshot_dir, 'meta.json'))
+
+
+@contextlib.contextmanager
+def _snapshot_lock(snapshot_dir):
+    # Serialises snapshot writers across worker processes (no-op where flock is unavailable)
+    if fcntl is None:
+        yield
+        return
+    with open(f'{snapshot_dir}.lock', 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _code_dtype(n_categories):
+    # The code width pandas itself picks for this many categories, so the
+    # mapped codes are used as they are instead of being cast (and copied)
+    for dtype in (np.int8, np.int16, np.int32):
+        if n_categories < np.iinfo(dtype).max:
+            return np.dtype(dtype)
+    return np.dtype(np.int64)
+
+
+def _column_file(generation, i, dtype):
+    # The generation keeps a rebuilt snapshot from reusing an older version's
+    # file names; the dtype changes when a column has to be widened
+    return f'{generation[:8]}-{i:03d}-{dtype}.bin'
+
+
+def _new_columns(df, generation):
+    columns = []
+    for i, name in enumerate(df.columns):
+        col = df[name]
+        if isinstance(col.dtype, pd.CategoricalDtype):
+            entry = {'name': name, 'kind': 'category', 'categories': col.cat.categories.tolist(),
+                     'ordered': bool(col.cat.ordered)}
+            dtype = _code_dtype(len(entry['categories']))
+        elif pd.api.types.is_numeric_dtype(col.dtype) or pd.api.types.is_bool_dtype(col.dtype):
+            entry = {'name': name, 'kind': 'numeric'}
+            dtype = col.to_numpy().dtype
+        else:
+            entry = {'name': name, 'kind': 'string', 'value_dtype': str(col.dtype), 'categories': []}
+            dtype = np.dtype(np.int32)
+        entry.update(dtype=dtype.name, file=_column_file(generation, i, dtype.name))
+        columns.append(entry)
+    index = {'name': None, 'kind': 'numeric', 'dtype': 'int64',
+             'file': f'{generation[:8]}-index.bin'}
+    return columns, index
+
+
+def _column_values(col, entry):
+    # Values of one column in the entry's stored representation. Codes are
+    # taken against the entry's category list, which is extended (never
+    # reordered) with values it hasn't seen. Returns the values and the dtype
+    # the file needs, which is wider than the stored one if the column outgrew it.
+    dtype = np.dtype(entry['dtype'])
+    if entry['kind'] == 'numeric':
+        values = col.to_numpy()
+        return values, np.result_type(dtype, values.dtype)
+    if isinstance(col.dtype, pd.CategoricalDtype):
+        codes = col.cat.codes.to_numpy()
+        labels = col.cat.categories
+        present = labels[np.unique(codes[codes >= 0])]
+    else:
+        codes, labels = pd.factorize(col, use_na_sentinel=True)
+        present = labels
+    categories = pd.Index(entry['categories'], dtype=object)
+    unseen = pd.Index(present, dtype=object).difference(categories, sort=False)
+    if len(unseen):
+        entry['categories'] = entry['categories'] + [str(v) if entry['kind'] == 'string' else v for v in unseen]
+        categories = pd.Index(entry['categories'], dtype=object)
+    # Recode through the small label table rather than row by row
+    mapping = categories.get_indexer(pd.Index(labels, dtype=object))
+    values = np.where(codes >= 0, mapping[np.clip(codes, 0, None)] if len(mapping) else -1, -1)
+    return values, np.result_type(dtype, _code_dtype(len(categories)))
+
+
+def _append_column(snapshot_dir, entry, values, needed, rows, generation, i):
+    path = os.path.join(snapshot_dir, entry['file'])
+    if needed != np.dtype(entry['dtype']):
+        # Widening writes the column again under a new name; files mapped by
+        # older versions stay as they are
+        old = np.fromfile(path, dtype=entry['dtype'], count=rows) if rows else np.empty(0)
+        entry['dtype'] = needed.name
+        entry['file'] = _column_file(generation, i, needed.name)
+        path = os.path.join(snapshot_dir, entry['file'])
+        with open(path, 'wb') as f:
+            old.astype(needed).tofile(f)
+    with open(path, 'ab') as f:
+        # Bytes past the recorded rows are left over from an interrupted append
+        f.truncate(rows * needed.itemsize)
+        np.ascontiguousarray(values, dtype=needed).tofile(f)
+
+
+def _append_rows(df, meta, snapshot_dir):
+    # Column files are matched by name: a batch file may order its header differently
+    names = [entry['name'] for entry in meta['columns']]
+    if sorted(df.columns) != sorted(names):
+        missing = [n for n in names if n not in df.columns]
+        extra = [n for n in df.columns if n not in names]
+        raise ValueError(f'new booking rows do not match the snapshot columns '
+                         f'(missing: {missing}, unexpected: {extra})')
+    df = df[names]
+    rows = meta['rows']
+    generation = meta['generation']
+    for i, (name, entry) in enumerate(zip(names, meta['columns'])):
+        values, needed = _column_values(df[name], entry)
+        _append_column(snapshot_dir, entry, values, needed, rows, generation, i)
+    _append_column(snapshot_dir, meta['index'], df.index.to_numpy(dtype=np.int64),
+                   np.dtype(meta['index']['dtype']), rows, generation, 0)
+    meta['rows'] = rows + len(df)
+    meta['segments'].append({'rows': len(df)})
+
+
+def map_columns(snapshot_dir, columns, index, start, stop, mmap_mode='r'):
+    # Rows [start, stop) of the snapshot as a DataFrame over the column files
+    def load(entry):
+        dtype = np.dtype(entry['dtype'])
+        path = os.path.join(snapshot_dir, entry['file'])
+        if stop == start:
+            return np.empty(0, dtype=dtype)
+        if mmap_mode is None:
+            return np.fromfile(path, dtype=dtype, count=stop - start, offset=start * dtype.itemsize)
+        return np.memmap(path, dtype=dtype, mode=mmap_mode, offset=start * dtype.itemsize, shape=(stop - start,))
+
+    data = {}
+    for entry in columns:
+        values = load(entry)
+        if entry['kind'] == 'category':
+            data[entry['name']] = pd.Categorical.from_codes(
+                values, categories=entry['categories'], ordered=entry['ordered'])
+        elif entry['kind'] == 'string':
+            # take() on the small array of distinct values is far cheaper than re-boxing every row
+            uniques = pd.array(entry['categories'], dtype=entry['value_dtype'])
+            data[entry['name']] = uniques.take(np.asarray(values, dtype=np.intp), allow_fill=True)
+        else:
+            data[entry['name']] = values
+    # copy=False keeps every column a view of its file (no block consolidation)
+    return pd.DataFrame(data, index=np.asarray(load(index)), copy=False)
+
+
+def concat_bookings(frames, ignore_index=False):
+    # pd.concat turns categoricals with different categories into object columns;
+    # union the categories first (existing order kept, new values appended)
+    frames = [f for f in frames if len(f.columns)]
+    for f in frames[1:]:
+        if sorted(f.columns) != sorted(frames[0].columns):
+            raise ValueError(f'booking files have different columns: {frames[0].columns.tolist()} '
+                             f'vs {f.columns.tolist()}')
+    if len(frames) == 1:
+        return frames[0].reset_index(drop=True) if ignore_index else frames[0]
+    aligned = [f.copy(deep=False) for f in frames]
+    for name in frames[0].columns:
+        dtypes = [f[name].dtype for f in frames]
+        if not all(isinstance(d, pd.CategoricalDtype) for d in dtypes):
+            continue
+        categories = pd.Index(dtypes[0].categories)
+        for d in dtypes[1:]:
+            categories = categories.append(pd.Index(d.categories).difference(categories, sort=False))
+        for f in aligned:
+            f[name] = f[name].cat.set_categories(categories)
+    return pd.concat(aligned, ignore_index=ignore_index)
+
+
+def write_snapshot(df, source, snapshot_dir=SNAPSHOT_DIR, **extra):
+    tmp_dir = f'{snapshot_dir}.tmp-{os.getpid()}'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    # A new generation id tells long-lived readers (BookingStore) to reload from scratch
+    generation = uuid.uuid4().hex
+    columns, index = _new_columns(df, generation)
+    meta = {
+        'version': SNAPSHOT_VERSION,
+        'generation': generation,
+        'source': source,
+        'columns': columns,
+        'index': index,
+        'rows': 0,
+        'segments': [],
+        **extra,
+    }
+    _append_rows(df, meta, tmp_dir)
+    _write_meta(meta, tmp_dir)
+
+    shutil.rmtree(snapshot_dir, ignore_errors=True)
+    os.replace(tmp_dir, snapshot_dir)
+    return meta
+
+
+def append_snapshot(delta, meta, snapshot_dir=SNAPSHOT_DIR):
+    _append_rows(delta, meta, snapshot_dir)
+    _write_meta(meta, snapshot_dir)
+    return meta
+
+
+def read_snapshot(snapshot_dir=SNAPSHOT_DIR, mmap_mode='r', start_segment=0, meta=None):
+    meta = meta or read_meta(snapshot_dir)
+    start = sum(segment['rows'] for segment in meta['segments'][:start_segment])
+    return map_columns(snapshot_dir, meta['columns'], meta['index'], start, meta['rows'], mmap_mode)
+
+
+# --- Shared store ---
+# Per data version, the small aggregates built from it and the column list
+# needed to map it, next to the snapshot. The frame itself is the snapshot's
+# column files: every worker process memory-maps the same files, so the pages
+# live once in the OS page cache however many processes and sessions read them.
+SHARED_KEEP = 2
+
+
+def shared_dir(snapshot_dir=SNAPSHOT_DIR):
+    return f'{snapshot_dir}.shared'
+
+
+def publish_shared(meta, key, snapshot_dir=SNAPSHOT_DIR, **aggregates):
+    root = shared_dir(snapshot_dir)
+    target = os.path.join(root, key)
+    if os.path.exists(target):
+        return target
+    tmp_dir = os.path.join(root, f'.tmp-{key}-{os.getpid()}')
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    frame = {'rows': meta['rows'], 'columns': meta['columns'], 'index': meta['index']}
+    with open(os.path.join(tmp_dir, 'frame.json'), 'w') as f:
+        json.dump(frame, f)
+    with open(os.path.join(tmp_dir, 'aggregates.pkl'), 'wb') as f:
+        pickle.dump(aggregates, f, protocol=pickle.HIGHEST_PROTOCOL)
+    try:
+        os.rename(tmp_dir, target)
+    except OSError:
+        # Another process published this version first
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    _prune_shared(root)
+    return target
+
+
+def _prune_shared(root):
+    entries = [e for e in os.scandir(root) if e.is_dir() and not e.name.startswith('.')]
+    entries.sort(key=lambda e: e.stat().st_mtime, reverse=True)
+    for entry in entries[SHARED_KEEP:]:
+        shutil.rmtree(entry.path, ignore_errors=True)
+
+
+def attach_shared(key, snapshot_dir=SNAPSHOT_DIR):
+    # (frame, aggregates) for a published version, or None if it hasn't been
+    # published (or was pruned, or its snapshot has since been rebuilt)
+    target = os.path.join(shared_dir(snapshot_dir), key)
+    try:
+        with open(os.path.join(target, 'frame.json')) as f:
+            frame = json.load(f)
+        with open(os.path.join(target, 'aggregates.pkl'), 'rb') as f:
+            aggregates = pickle.load(f)
+        df = map_columns(snapshot_dir, frame['columns'], frame['index'], 0, frame['rows'])
+        return df, aggregates
+    except (OSError, ValueError):
+        return None
+
+
+# --- Ingest ---
+def _rebuild_snapshot(path, snapshot_dir, batch_dir):
+    raw = pd.read_csv(path, encoding='latin1')
+    csv_columns = raw.columns.tolist()
+    text_columns = [c for c in csv_columns if not pd.api.types.is_numeric_dtype(raw[c].dtype)]
+    df = clean_bookings(raw)
+    size = os.path.getsize(path)
+    source = {
+        'size': size,
+        'mtime_ns': os.stat(path).st_mtime_ns,
+        # Byte ranges of the CSV already ingested, each with its own hash
+        'chunks': [{'end': size, 'sha256': file_sha256(path, 0, size)}],
+        'tail_sha256': _tail_sha256(path, size),
+        'ends_with_newline': _ends_with_newline(path, size),
+    }
+    meta = write_snapshot(df, source, snapshot_dir, csv_columns=csv_columns,
+                          text_columns=text_columns, raw_rows=len(raw), batches=[])
+    # Batch files already present when the snapshot is rebuilt are folded in as deltas
+    _ingest_deltas(path, snapshot_dir, batch_dir, meta)
+    return df
+
+
+def _parse_delta(source, meta, **read_csv_kwargs):
+    raw = pd.read_csv(source, encoding='latin1', dtype={c: str for c in meta['text_columns']},
+                      **read_csv_kwargs)
+    raw.index = pd.RangeIndex(meta['raw_rows'], meta['raw_rows'] + len(raw))
+    meta['raw_rows'] += len(raw)
+    return clean_bookings(raw)
+
+
+def _csv_tail(path, meta):
+    # Bytes appended since the last ingest, cut at the last complete line so a
+    # row that is still being written is picked up on the next refresh
+    src = meta['source']
+    with open(path, 'rb') as f:
+        f.seek(src['size'])
+        tail = f.read()
+    return tail[:tail.rfind(b'\n') + 1]
+
+
+def _ingest_deltas(path, snapshot_dir, batch_dir, meta):
+    deltas = []
+    tail = _csv_tail(path, meta)
+    if tail:
+        deltas.append(_parse_delta(io.BytesIO(tail), meta, header=None, names=meta['csv_columns']))
+        src = meta['source']
+        start, src['size'] = src['size'], src['size'] + len(tail)
+        src['chunks'].append({'end': src['size'], 'sha256': file_sha256(path, start, src['size'])})
+        src['tail_sha256'] = _tail_sha256(path, src['size'])
+        src['ends_with_newline'] = True
+    src_mtime = os.stat(path).st_mtime_ns
+    # Batch files are treated as immutable once dropped; each is ingested once, by name
+    if batch_dir and os.path.isdir(batch_dir):
+        names = [n for n in sorted(os.listdir(batch_dir)) if n.endswith('.csv') and n not in meta['batches']]
+        if names:
+            batch, meta['raw_rows'] = read_booking_partitions(
+                [os.path.join(batch_dir, n) for n in names], meta['text_columns'], meta['raw_rows'])
+            deltas.append(batch)
+            meta['batches'].extend(names)
+    if not deltas:
+        return False
+    meta['source']['mtime_ns'] = src_mtime
+    append_snapshot(concat_bookings(deltas), meta, snapshot_dir)
+    return True
+
+
+def _source_unchanged(path, src):
+    # mtime changed (e.g. fresh checkout or redeploy): fall back to the content hashes
+    start = 0
+    for chunk in src['chunks']:
+        if file_sha256(path, start, chunk['end']) != chunk['sha256']:
+            return False
+        start = chunk['end']
+    return True
+
+
+def _sync_partitions(source, snapshot_dir):
+    # New partition files become a new segment; a changed or removed one forces a rebuild
+    meta = read_meta(snapshot_dir)
+    stamps = {p: _file_stamp(p) for p in partition_paths(source)}
+    seen = meta.get('partitions') if meta and meta.get('version') == SNAPSHOT_VERSION else None
+    if seen is None or any(stamps.get(p) != stamp for p, stamp in seen.items()):
+        df, raw_rows = read_booking_partitions(list(stamps))
+        write_snapshot(df, None, snapshot_dir, partitions=stamps, raw_rows=raw_rows)
+        return 'rebuilt'
+    new = [p for p in stamps if p not in seen]
+    if not new:
+        return 'fresh'
+    delta, meta['raw_rows'] = read_booking_partitions(new, row_offset=meta['raw_rows'])
+    seen.update({p: stamps[p] for p in new})
+    append_snapshot(delta, meta, snapshot_dir)
+    return 'appended'
+
+
+def sync_snapshot(path=CSV_PATH, snapshot_dir=SNAPSHOT_DIR, batch_dir=BATCH_DIR):
+    # Brings the on-disk snapshot up to date with the CSV and batch directory
+    # (or with the partition files when path is a directory/glob).
+    # Returns 'fresh' (nothing new), 'appended' (new segment written) or 'rebuilt'.
+    with _snapshot_lock(snapshot_dir):
+        if is_partitioned(path):
+            return _sync_partitions(path, snapshot_dir)
+        meta = read_meta(snapshot_dir)
+        if meta is None or meta.get('version') != SNAPSHOT_VERSION or meta.get('source') is None:
+            _rebuild_snapshot(path, snapshot_dir, batch_dir)
+            return 'rebuilt'
+        src = meta['source']
+        stat = os.stat(path)
+        if stat.st_size == src['size']:
+            if stat.st_mtime_ns != src['mtime_ns']:
+                if not _source_unchanged(path, src):
+                    _rebuild_snapshot(path, snapshot_dir, batch_dir)
+                    return 'rebuilt'
+                src['mtime_ns'] = stat.st_mtime_ns
+                _write_meta(meta, snapshot_dir)
+        elif not (stat.st_size > src['size'] and src['ends_with_newline']
+                  and _tail_sha256(path, src['size']) == src['tail_sha256']):
+            # Shrunk or rewritten rather than appended to
+            _rebuild_snapshot(path, snapshot_dir, batch_dir)
+            return 'rebuilt'
+        return 'appended' if _ingest_deltas(path, snapshot_dir, batch_dir, meta) else 'fresh'
+
+
+# --- Entry point used by the dashboards ---
+def is_read_only_error(exc):
+    # The snapshot can't be written in this deployment at all. Any other
+    # failure is a real ingest error and must not be hidden by a fallback.
+    return isinstance(exc, PermissionError) or exc.errno == errno.EROFS
+
+
+def load_bookings(path=CSV_PATH, snapshot_dir=SNAPSHOT_DIR, batch_dir=BATCH_DIR):
+    try:
+        sync_snapshot(path, snapshot_dir, batch_dir)
+    except OSError as exc:
+        if not is_read_only_error(exc):
+            raise
+        # Read-only deployments still work, they just pay the CSV parse every cold start
+        return read_bookings_csv(path)
+    return read_snapshot(snapshot_dir)
+
+if __name__ == '__main__':
+    # python booking_data.py -> per-column memory report of the cleaned frame
+    print(memory_report(load_bookings()).to_string())
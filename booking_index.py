@@ -0,0 +1,91 @@
+import numpy as np
+import pandas as pd
+
+# Row indexes behind the dashboard filters. Each filter column is indexed once
+# per data version; a combination of filters then resolves to a row mask with
+# bitwise OR (values within a column) and AND (across columns) instead of
+# comparing every row against every selected value on each rerun.
+
+FILTER_COLUMNS = ['route', 'booking_origin', 'sales_channel', 'trip_type', 'flight_day', 'flight_hour']
+# Columns with at most this many distinct values keep one packed bitmap per
+# value; wider ones (route, booking_origin) keep sorted row positions instead,
+# which are packed into a bitmap only for the values actually selected
+BITMAP_MAX_VALUES = 64
+
+
+class BookingIndex:
+    def __init__(self, df, columns=FILTER_COLUMNS, base=None):
+        # base: the index of an earlier version of the same append-only frame
+        # (its first base.rows rows); it is extended with the rows after it
+        # instead of grouping the whole history again
+        self.rows = len(df)
+        start = base.rows if base is not None else 0
+        self.bitmaps = {}
+        self.positions = {}
+        for col in columns:
+            groups = self._groups(df[col].iloc[start:], start)
+            if base is not None and col in base.bitmaps:
+                self.bitmaps[col] = self._extend_bitmaps(base.bitmaps[col], groups, start)
+            elif base is not None and col in base.positions:
+                old = base.positions[col]
+                # Appended positions all come after the earlier ones, so each run stays sorted
+                self.positions[col] = {
+                    value: np.concatenate([old[value], groups[value]]) if value in old and value in groups
+                    else old.get(value, groups.get(value))
+                    for value in [*old, *(v for v in groups if v not in old)]
+                }
+            elif len(groups) <= BITMAP_MAX_VALUES:
+                self.bitmaps[col] = {value: self._pack(rows) for value, rows in groups.items()}
+            else:
+                self.positions[col] = groups
+
+    @staticmethod
+    def _groups(values, offset=0):
+        # {value: ascending row positions}, shifted by offset
+        codes, uniques = pd.factorize(values)
+        # Stable sort by code: each value's rows form one ascending run
+        order = np.argsort(codes, kind='stable')
+        bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+        order += offset
+        return {uniques[i]: order[bounds[i]:bounds[i + 1]] for i in range(len(uniques))}
+
+    def _extend_bitmaps(self, old, groups, start):
+        # Earlier bytes are copied as they are; only the bytes from the first
+        # appended row on are packed
+        first = start // 8
+        maps = {}
+        for value in [*old, *(v for v in groups if v not in old)]:
+            packed = np.zeros((self.rows + 7) // 8, dtype=np.uint8)
+            if value in old:
+                packed[:len(old[value])] = old[value]
+            if value in groups:
+                bits = np.zeros(self.rows - first * 8, dtype=bool)
+                bits[groups[value] - first * 8] = True
+                packed[first:] |= np.packbits(bits)
+            maps[value] = packed
+        return maps
+
+    def _pack(self, rows):
+        bits = np.zeros(self.rows, dtype=bool)
+        bits[rows] = True
+        return np.packbits(bits)
+
+    def column_bitmap(self, col, values):
+        if col in self.bitmaps:
+            maps = [self.bitmaps[col][v] for v in values if v in self.bitmaps[col]]
+            if not maps:
+                return np.zeros((self.rows + 7) // 8, dtype=np.uint8)
+            return np.bitwise_or.reduce(maps)
+        groups = self.positions[col]
+        rows = [groups[v] for v in values if v in groups]
+        return self._pack(np.concatenate(rows) if rows else np.array([], dtype=np.intp))
+
+    def mask(self, filters):
+        # filters: ((column, (values, ...)), ...); columns left out are unfiltered
+        packed = None
+        for col, values in filters:
+            bitmap = self.column_bitmap(col, values)
+            packed = bitmap if packed is None else packed & bitmap
+        if packed is None:
+            return np.ones(self.rows, dtype=bool)
+        return np.unpackbits(packed, count=self.rows).astype(bool)
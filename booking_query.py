@@ -0,0 +1,391 @@
+import glob
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+
+import numpy as np
+import pandas as pd
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+try:
+    import polars as pl
+except ImportError:
+    pl = None
+
+from booking_data import CSV_PATH, BATCH_DIR, TEXT_COLUMNS, apply_schema, is_partitioned, partition_paths
+from booking_aggregates import (CUBE_DIMENSIONS, CORR_DIMENSIONS, CorrelationSums,
+                                 RankCodes, CompletionDrilldown, binned_scatter, stratified_sample)
+
+# Query layer behind the dashboard panels. Every engine answers the same
+# queries for a filter tuple ((column, (values, ...)), ...):
+#   cube()                              aggregate cube in build_cube() shape (KPIs, count charts)
+#   numeric_columns()                   numeric columns, in file order
+#   value_counts(col, filters)          Series of counts indexed by (booking_status, value)
+#                                       (histogram and box plot, see counts_histogram)
+#   corr(columns, filters, method)      'Pearson' or 'Spearman' matrix as a DataFrame
+#   binned_scatter(x, y, filters)       occupied (booking_status, x bin, y bin) cells with counts
+#   sample(columns, filters, n)         at most n bookings for the point scatter
+#   completion(dims, filters)           completion rate per combination of dims
+# 'pandas' answers from the in-memory store (cube, running correlation sums,
+# filter index). 'duckdb' and 'polars' run the queries on the source files
+# with their own multithreaded columnar scans: filters are pushed into the
+# scan and only aggregated (or sampled) rows are handed to Python, so the
+# dashboard never loads the booking frame with these engines.
+
+QUERY_ENGINES = ['pandas', 'duckdb', 'polars']
+
+
+def available_engines():
+    return [name for name, module in [('pandas', pd), ('duckdb', duckdb), ('polars', pl)] if module is not None]
+
+
+def resolve_engine(name):
+    # Unknown or uninstalled engines fall back to pandas
+    return name if name in available_engines() else 'pandas'
+
+
+def source_files(source=CSV_PATH, batch_dir=BATCH_DIR):
+    # The files the store ingests, in the same order: the export (or its
+    # partitions) followed by the batch directory
+    if is_partitioned(source):
+        return partition_paths(source)
+    batches = sorted(glob.glob(os.path.join(batch_dir, '*.csv'))) if batch_dir else []
+    return [source] + batches
+
+
+def source_version(source=CSV_PATH, batch_dir=BATCH_DIR):
+    # Cache key for the engines that scan the files directly: changes whenever
+    # a source file is added, replaced or appended to
+    stamps = [(p, os.stat(p).st_size, os.stat(p).st_mtime_ns) for p in source_files(source, batch_dir)]
+    return hashlib.sha256(json.dumps(stamps).encode()).hexdigest()[:16]
+
+
+def _cube_frame(raw):
+    # Engine results come back with plain strings/ints; match the store's cube dtypes
+    cube = apply_schema(raw)
+    for col in ['bookings', 'completed', 'passengers', 'first_row']:
+        cube[col] = cube[col].astype('int64')
+    for col in ['duration_min', 'duration_max']:
+        cube[col] = cube[col].astype('float32')
+    return cube.sort_values(CUBE_DIMENSIONS, kind='stable').reset_index(drop=True)
+
+
+def _counts_series(raw, col):
+    counts = raw.set_index(['booking_status', col])['count'].astype('int64').sort_index()
+    counts.index = counts.index.set_levels(counts.index.levels[1].astype(float), level=1)
+    return counts
+
+
+def _completion_table(raw, dims):
+    # raw: counts per (dims..., booking_complete); same shape as CompletionDrilldown.table()
+    raw = raw.assign(completed=raw['count'].where(raw['booking_complete'] == 1, 0))
+    if dims:
+        table = raw.groupby(list(dims), dropna=False)[['count', 'completed']].sum().reset_index()
+    else:
+        table = raw[['count', 'completed']].sum().to_frame().T
+    table = apply_schema(table.rename(columns={'count': 'bookings'}))
+    table['bookings'] = table['bookings'].astype('int64')
+    table['completed'] = table['completed'].astype('int64')
+    table['completion_rate'] = table['completed'] / table['bookings'] * 100
+    return table.sort_values('bookings', ascending=False, kind='stable', ignore_index=True)
+
+
+def _corr_frame(columns, pairs):
+    # pairs: {(i, j): r} for i <= j
+    corr = np.full((len(columns), len(columns)), np.nan)
+    for (i, j), r in pairs.items():
+        corr[i, j] = corr[j, i] = np.nan if r is None else r
+    return pd.DataFrame(corr, index=columns, columns=columns)
+
+
+# --- pandas ---
+class PandasEngine:
+    name = 'pandas'
+
+    def __init__(self, df, cube, corr, mask):
+        # mask(filters) -> boolean row mask (the dashboard's cached index lookup)
+        self.df = df
+        self._cube = cube
+        self._corr = corr
+        self._mask = mask
+        # Ranking and drilldown codes are built on first use, once per engine
+        self._lock = threading.Lock()
+        self._ranks = None
+        self._drilldown = None
+
+    def _rows(self, filters):
+        return self.df[self._mask(filters)] if filters else self.df
+
+    def cube(self):
+        return self._cube
+
+    def numeric_columns(self):
+        return self.df.select_dtypes(include=[np.number]).columns.tolist()
+
+    def value_counts(self, col, filters=()):
+        df = self._rows(filters)
+        counts = df.groupby(['booking_status', col], observed=True).size()
+        counts.index = counts.index.set_levels(counts.index.levels[1].astype(float), level=1)
+        return counts
+
+    def corr(self, columns, filters=(), method='Pearson'):
+        if method == 'Spearman':
+            with self._lock:
+                if self._ranks is None:
+                    self._ranks = RankCodes(self.df, self.numeric_columns())
+            return self._ranks.matrix(self._mask(filters) if filters else None).loc[columns, columns]
+        if all(col in CORR_DIMENSIONS for col, _ in filters) and self._corr.columns == list(columns):
+            return self._corr.matrix(dict(filters))
+        # Route/origin/hour filters aren't kept in the running sums; one pass over the view
+        return CorrelationSums(columns).update(self._rows(filters)).matrix()
+
+    def binned_scatter(self, x, y, filters=()):
+        return binned_scatter(self._rows(filters), x, y)
+
+    def sample(self, columns, filters=(), n=5000):
+        # Proportional per booking status, so the sampled mix matches the view
+        return stratified_sample(self._rows(filters), 'booking_status', n)[list(columns)]
+
+    def completion(self, dims, filters=()):
+        with self._lock:
+            if self._drilldown is None:
+                self._drilldown = CompletionDrilldown(self.df)
+        return self._drilldown.table(dims, self._mask(filters) if filters else None)
+
+
+# --- Shared by the scanning engines ---
+class _ScanEngine:
+    # Subclasses provide group_counts(columns, filters) -> DataFrame of the
+    # distinct combinations with a 'count' column; the distribution, scatter
+    # and drilldown queries are folded from those counts in pandas.
+    def value_counts(self, col, filters=()):
+        return _counts_series(self.group_counts(['booking_status', col], filters), col)
+
+    def binned_scatter(self, x, y, filters=()):
+        columns = list(dict.fromkeys(['booking_status', x, y]))
+        return binned_scatter(self.group_counts(columns, filters), x, y, weights='count')
+
+    def completion(self, dims, filters=()):
+        raw = self.group_counts(list(dims) + ['booking_complete'], filters)
+        return _completion_table(raw, dims)
+
+
+# --- DuckDB ---
+class DuckDBEngine(_ScanEngine):
+    name = 'duckdb'
+
+    def __init__(self, paths):
+        self.paths = list(paths)
+        self._con = duckdb.connect()
+        self._lock = threading.Lock()
+
+    def _cursor(self):
+        # One connection per engine; each query gets its own cursor so sessions
+        # on different threads can query at the same time
+        with self._lock:
+            return self._con.cursor()
+
+    def _source(self):
+        csvs = [p for p in self.paths if not p.endswith('.parquet')]
+        parquets = [p for p in self.paths if p.endswith('.parquet')]
+        text = ', '.join(f"'{c}': 'VARCHAR'" for c in TEXT_COLUMNS)
+        scans = []
+        if csvs:
+            scans.append(f"SELECT * FROM read_csv({csvs!r}, header = true, encoding = 'latin-1', "
+                         f"union_by_name = true, types = {{{text}}})")
+        if parquets:
+            scans.append(f"SELECT * FROM read_parquet({parquets!r}, union_by_name = true)")
+        # The cleaning steps of clean_bookings() that the queries depend on
+        return (f"SELECT *, CASE WHEN booking_complete = 1 THEN 'Complete' ELSE 'Incomplete' END "
+                f"AS booking_status FROM ({' UNION ALL BY NAME '.join(scans)}) "
+                f"WHERE purchase_lead >= 0 AND length_of_stay >= 0")
+
+    def _where(self, filters):
+        clauses, params = [], []
+        for col, values in filters:
+            clauses.append(f'"{col}" IN ({", ".join("?" * len(values))})')
+            params += [str(v) if col in TEXT_COLUMNS else v for v in values]
+        return (' WHERE ' + ' AND '.join(clauses)) if clauses else '', params
+
+    def cube(self):
+        dims = ', '.join(f'"{d}"' for d in CUBE_DIMENSIONS)
+        # row_number() follows file order, so first_row breaks KPI ties like the store does
+        return _cube_frame(self._cursor().execute(f"""
+            SELECT {dims},
+                   count(*) AS bookings,
+                   sum(booking_complete) AS completed,
+                   sum(num_passengers) AS passengers,
+                   min(flight_duration) AS duration_min,
+                   max(flight_duration) AS duration_max,
+                   min(_row) AS first_row
+            FROM (SELECT *, row_number() OVER () - 1 AS _row FROM ({self._source()}))
+            GROUP BY {dims}
+        """).df())
+
+    def numeric_columns(self):
+        empty = self._cursor().execute(f"SELECT * FROM ({self._source()}) LIMIT 0").df()
+        return empty.select_dtypes(include=[np.number]).columns.tolist()
+
+    def group_counts(self, columns, filters=()):
+        where, params = self._where(filters)
+        cols = ', '.join(f'"{c}"' for c in columns)
+        return self._cursor().execute(f"""
+            SELECT {cols}, count(*) AS count
+            FROM ({self._source()}){where}
+            GROUP BY {cols}
+        """, params).df()
+
+    def corr(self, columns, filters=(), method='Pearson'):
+        columns = list(columns)
+        where, params = self._where(filters)
+        # Rows with a missing value in any column are left out, like CorrelationSums
+        complete = ' AND '.join(f'"{c}" IS NOT NULL' for c in columns)
+        where = f'{where} AND {complete}' if where else f' WHERE {complete}'
+        source = f"SELECT * FROM ({self._source()}){where}"
+        if method == 'Spearman':
+            # Average ranks (ties share the mean of their positions), as RankCodes does
+            ranks = ', '.join(f'rank() OVER (ORDER BY "{c}") + (count(*) OVER (PARTITION BY "{c}") - 1) / 2.0 '
+                              f'AS "{c}"' for c in columns)
+            source = f"SELECT {ranks} FROM ({source})"
+        pairs = [(i, j) for i in range(len(columns)) for j in range(i, len(columns))]
+        exprs = ', '.join(f'corr("{columns[i]}", "{columns[j]}")' for i, j in pairs)
+        row = self._cursor().execute(f"SELECT {exprs} FROM ({source})", params).fetchone()
+        return _corr_frame(columns, dict(zip(pairs, row)))
+
+    def sample(self, columns, filters=(), n=5000):
+        # Uniform reservoir sample of the filtered rows (all of them when there are fewer)
+        where, params = self._where(filters)
+        cols = ', '.join(f'"{c}"' for c in columns)
+        return self._cursor().execute(f"""
+            SELECT * FROM (SELECT {cols} FROM ({self._source()}){where})
+            USING SAMPLE reservoir({int(n)} ROWS) REPEATABLE (0)
+        """, params).df()
+
+
+# --- Polars ---
+UTF8_DIR = '.booking_cache.utf8'
+
+
+def utf8_copy(path, cache_dir=UTF8_DIR):
+    # scan_csv only decodes UTF-8 and the export is latin-1 ("Réunion"); scan a
+    # transcoded copy, kept per (path, size, mtime), so labels match the store's
+    stat = os.stat(path)
+    key = hashlib.sha256(os.path.abspath(path).encode()).hexdigest()[:16]
+    target = os.path.join(cache_dir, f'{key}-{stat.st_size}-{stat.st_mtime_ns}.csv')
+    if os.path.exists(target):
+        return target
+    os.makedirs(cache_dir, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=cache_dir, prefix=f'.{key}.')
+    try:
+        with open(path, encoding='latin1', newline='') as src, os.fdopen(fd, 'w', encoding='utf-8', newline='') as dst:
+            shutil.copyfileobj(src, dst, 1 << 20)
+        os.replace(tmp, target)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    # Copies of earlier versions of the same file are no longer scanned
+    for stale in glob.glob(os.path.join(cache_dir, f'{key}-*.csv')):
+        if stale != target:
+            try:
+                os.remove(stale)
+            except OSError:
+                pass
+    return target
+
+
+class PolarsEngine(_ScanEngine):
+    name = 'polars'
+
+    def __init__(self, paths):
+        self.paths = list(paths)
+
+    def _scan_csv(self, path):
+        text = {c: pl.String for c in TEXT_COLUMNS}
+        try:
+            return pl.scan_csv(utf8_copy(path), schema_overrides=text)
+        except OSError:
+            # No room for the copy: let read_csv decode latin-1 in memory instead
+            return pl.read_csv(path, encoding='latin1', schema_overrides=text).lazy()
+
+    def _source(self):
+        csvs = [p for p in self.paths if not p.endswith('.parquet')]
+        parquets = [p for p in self.paths if p.endswith('.parquet')]
+        scans = [self._scan_csv(p) for p in csvs]
+        if parquets:
+            scans.append(pl.scan_parquet(parquets))
+        frame = pl.concat(scans, how='diagonal_relaxed') if len(scans) > 1 else scans[0]
+        return frame.filter((pl.col('purchase_lead') >= 0) & (pl.col('length_of_stay') >= 0)).with_columns(
+            booking_status=pl.when(pl.col('booking_complete') == 1)
+            .then(pl.lit('Complete')).otherwise(pl.lit('Incomplete')))
+
+    def _filtered(self, filters):
+        frame = self._source()
+        for col, values in filters:
+            frame = frame.filter(pl.col(col).is_in([str(v) if col in TEXT_COLUMNS else v for v in values]))
+        return frame
+
+    def cube(self):
+        raw = (
+            self._source()
+            .with_row_index('_row')
+            .group_by(CUBE_DIMENSIONS)
+            .agg(
+                bookings=pl.len(),
+                completed=pl.col('booking_complete').sum(),
+                passengers=pl.col('num_passengers').sum(),
+                duration_min=pl.col('flight_duration').min(),
+                duration_max=pl.col('flight_duration').max(),
+                first_row=pl.col('_row').min(),
+            )
+            .collect()
+        )
+        return _cube_frame(raw.to_pandas())
+
+    def numeric_columns(self):
+        return [name for name, dtype in self._source().collect_schema().items() if dtype.is_numeric()]
+
+    def group_counts(self, columns, filters=()):
+        return self._filtered(filters).group_by(columns).agg(count=pl.len()).collect().to_pandas()
+
+    def corr(self, columns, filters=(), method='Pearson'):
+        columns = list(columns)
+        frame = self._filtered(filters).drop_nulls(columns).select(columns)
+        if method == 'Spearman':
+            frame = frame.select([pl.col(c).rank('average') for c in columns])
+        pairs = [(i, j) for i in range(len(columns)) for j in range(i, len(columns))]
+        row = (
+            frame
+            .select([pl.corr(columns[i], columns[j]).alias(f'{i}_{j}') for i, j in pairs])
+            .collect()
+            .row(0)
+        )
+        return _corr_frame(columns, dict(zip(pairs, row)))
+
+    def sample(self, columns, filters=(), n=5000):
+        # Uniform sample of the filtered rows: a shuffled row number is kept
+        # below n, so only the sampled rows are collected
+        return (
+            self._filtered(filters)
+            .select(columns)
+            .filter(pl.int_range(pl.len()).shuffle(seed=0) < n)
+            .collect()
+            .to_pandas()
+        )
+
+
+def make_engine(name, source=CSV_PATH, batch_dir=BATCH_DIR, **pandas_state):
+    # pandas_state: df, cube, corr and mask for the pandas engine
+    name = resolve_engine(name)
+    if name == 'duckdb':
+        return DuckDBEngine(source_files(source, batch_dir))
+    if name == 'polars':
+        return PolarsEngine(source_files(source, batch_dir))
+    return PandasEngine(**pandas_state)
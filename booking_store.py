@@ -0,0 +1,173 @@
+import logging
+import threading
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+
+from booking_data import (CSV_PATH, SNAPSHOT_DIR, BATCH_DIR, sync_snapshot, read_snapshot,
+                          read_meta, publish_shared, attach_shared,
+                          read_bookings_csv, data_version, is_read_only_error)
+from booking_aggregates import build_cube, merge_cubes, CorrelationSums, CORR_DIMENSIONS
+
+
+# Long-lived holder for the cleaned booking frame, its aggregate cube and the
+# correlation sums behind the heatmap.
+# The frame is the memory-mapped snapshot. refresh() folds in rows appended to
+# the CSV and new files in BATCH_DIR by reading only the new snapshot segments,
+# so its cost follows the delta size. The aggregates of each version are then
+# published to the shared store: a process that finds the version already
+# published (another replica got there first) skips the work entirely and
+# maps the same snapshot files.
+# Where the snapshot directory can't be written (permissions, read-only
+# mounts) the store parses the source in memory instead, like load_bookings();
+# any other ingest failure is raised.
+# Each refresh produces a new immutable BookingVersion; get(version) returns the
+# objects of a given version even after another session has refreshed past it,
+# so caches keyed by version never mix data from two versions.
+BookingVersion = namedtuple('BookingVersion', ['version', 'df', 'cube', 'corr'])
+# Versions kept in memory for get(); older ones are re-attached from the shared store
+VERSIONS_KEEP = 2
+
+logger = logging.getLogger('booking.store')
+
+
+class BookingStore:
+    def __init__(self, path=CSV_PATH, snapshot_dir=SNAPSHOT_DIR, batch_dir=BATCH_DIR):
+        self.path = path
+        self.snapshot_dir = snapshot_dir
+        self.batch_dir = batch_dir
+        self.current = BookingVersion(None, None, None, None)
+        self._versions = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = None
+        self._segments = 0
+        self._read_only = False
+        self.refresh()
+
+    # The current version's objects, for callers that don't track versions
+    @property
+    def version(self):
+        return self.current.version
+
+    @property
+    def df(self):
+        return self.current.df
+
+    @property
+    def cube(self):
+        return self.current.cube
+
+    @property
+    def corr(self):
+        return self.current.corr
+
+    def get(self, version):
+        # The objects of `version`; KeyError once it's neither in memory nor published
+        with self._lock:
+            if version in self._versions:
+                return self._versions[version]
+        loaded = self._attach(version)
+        if loaded is None:
+            raise KeyError(version)
+        return loaded
+
+    @staticmethod
+    def extends(old, new):
+        # True when version `new` is `old` with rows appended: same snapshot
+        # generation, at least as many segments. Parsed (csv-) versions never are.
+        if not old or not new or old.startswith('csv-') or new.startswith('csv-'):
+            return False
+        old_generation, _, old_segments = old.rpartition('-')
+        new_generation, _, new_segments = new.rpartition('-')
+        return old_generation == new_generation and int(old_segments) <= int(new_segments)
+
+    def _set_current(self, loaded):
+        self.current = loaded
+        self._versions[loaded.version] = loaded
+        while len(self._versions) > VERSIONS_KEEP:
+            self._versions.popitem(last=False)
+
+    def _attach(self, version):
+        shared = attach_shared(version, self.snapshot_dir)
+        if shared is None:
+            return None
+        df, aggregates = shared
+        return BookingVersion(version, df, aggregates['cube'], aggregates['corr'])
+
+    def _build_all(self, version, df):
+        corr = CorrelationSums(df.select_dtypes(include=[np.number]).columns, by=CORR_DIMENSIONS).update(df)
+        return BookingVersion(version, df, build_cube(df), corr)
+
+    def _build(self, version, meta):
+        if meta['generation'] != self._generation:
+            return self._build_all(version, read_snapshot(self.snapshot_dir, meta=meta))
+        # Other worker processes may have written segments too; read everything we haven't seen
+        previous = self.current
+        delta = read_snapshot(self.snapshot_dir, start_segment=self._segments, meta=meta)
+        cube = merge_cubes(previous.cube, build_cube(delta, row_offset=len(previous.df)))
+        corr = previous.corr.copy().update(delta)
+        # Earlier rows are untouched by appends: the new version is a longer mapping
+        return BookingVersion(version, read_snapshot(self.snapshot_dir, meta=meta), cube, corr)
+
+    def _refresh_private(self):
+        # Snapshot unavailable: reparse whenever the source changes
+        version = f'csv-{data_version(self.path)}'
+        if version == self.version:
+            return 0
+        self._set_current(self._build_all(version, read_bookings_csv(self.path)))
+        self._generation = None
+        self._segments = 0
+        return -1
+
+    def refresh(self):
+        # Returns the number of new rows folded in (-1 after a full reload)
+        with self._lock:
+            try:
+                sync_snapshot(self.path, self.snapshot_dir, self.batch_dir)
+                meta = read_meta(self.snapshot_dir)
+            except OSError as exc:
+                if not is_read_only_error(exc):
+                    raise
+                if not self._read_only:
+                    logger.warning('cannot write the booking snapshot in %s (%s); parsing %s in memory instead',
+                                   self.snapshot_dir, exc, self.path)
+                    self._read_only = True
+                return self._refresh_private()
+            if meta is None:
+                return self._refresh_private()
+            # Same value in every worker process that has loaded the same segments
+            version = f"{meta['generation']}-{len(meta['segments'])}"
+            if version == self.version:
+                return 0
+            reload = meta['generation'] != self._generation
+            rows = 0 if reload else len(self.df)
+            loaded = self._attach(version)
+            if loaded is None:
+                loaded = self._build(version, meta)
+                try:
+                    publish_shared(meta, version, self.snapshot_dir, cube=loaded.cube, corr=loaded.corr)
+                except OSError:
+                    pass  # other processes will build their own aggregates
+            self._set_current(loaded)
+            self._generation = meta['generation']
+            self._segments = len(meta['segments'])
+            return -1 if reload else len(self.df) - rows
+
+
+# Immutable handle for sharing one frame between sessions via st.cache_resource.
+# The column data is never copied: .frame hands out a shallow copy, so a caller
+# that adds/drops columns or filters in place only changes its own object, and
+# copy-on-write keeps value edits from reaching the shared arrays. Callers that
+# need a private, writable frame ask for .copy() explicitly.
+class FrameHandle:
+    def __init__(self, df):
+        self._df = df
+        self.rows = len(df)
+        self.columns = df.columns.tolist()
+
+    @property
+    def frame(self):
+        return self._df.copy(deep=False)
+
+    def copy(self):
+        return self._df.copy(deep=True)
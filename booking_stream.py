@@ -0,0 +1,132 @@
+import numpy as np
+import pandas as pd
+
+from booking_data import CSV_PATH, TEXT_COLUMNS, clean_bookings, is_partitioned, partition_paths
+from booking_aggregates import (build_cube, merge_cubes, bin_edges, counts_histogram, counts_box_summary,
+                                scatter_cell_counts, scatter_cells, CorrelationSums, CORR_DIMENSIONS,
+                                midrank_table)
+
+# Out-of-core mode for booking exports that don't fit in memory: the CSV is
+# read in chunks, each chunk is cleaned like load_data() does, and only the
+# aggregates the dashboard needs are kept. Memory is bounded by the chunk size
+# and the number of distinct values/combinations, never by the row count.
+
+STREAM_CHUNK_ROWS = 250_000
+# Per-column sketches keep exact value counts up to this many distinct values
+# per status, then coarsen the values onto a grid of this many steps
+SKETCH_MAX_VALUES = 4096
+
+
+def iter_booking_chunks(path=CSV_PATH, chunksize=STREAM_CHUNK_ROWS):
+    paths = partition_paths(path) if is_partitioned(path) else [path]
+    for part in paths:
+        reader = pd.read_csv(part, encoding='latin1', chunksize=chunksize,
+                             dtype={c: str for c in TEXT_COLUMNS})
+        for raw in reader:
+            yield clean_bookings(raw)
+
+
+# --- Column sketch ---
+# Value -> count per booking status. Exact for the booking columns (all of
+# them have at most a few hundred distinct values); wider columns are rounded
+# onto a fixed grid so histograms and quartiles stay approximately right.
+class ColumnSketch:
+    def __init__(self, column, by='booking_status', max_values=SKETCH_MAX_VALUES):
+        self.column = column
+        self.by = by
+        self.max_values = max_values
+        self.step = None
+        self.counts = None
+
+    def update(self, chunk):
+        values = chunk[self.column].astype(float)
+        if self.step is not None:
+            values = (values / self.step).round() * self.step
+        # Plain object labels so chunks with different category sets line up
+        new = values.groupby([chunk[self.by].astype(object), values]).size()
+        self.counts = new if self.counts is None else self.counts.add(new, fill_value=0).astype('int64')
+        if self.counts.groupby(level=0).size().max() > self.max_values:
+            self._coarsen()
+        return self
+
+    def _coarsen(self):
+        values = self.counts.index.get_level_values(1).to_numpy(dtype=float)
+        self.step = (values.max() - values.min()) / self.max_values
+        rounded = (values / self.step).round() * self.step
+        self.counts = self.counts.groupby([self.counts.index.get_level_values(0), rounded]).sum()
+        self.counts.index.names = [self.by, self.column]
+
+    def distinct_values(self):
+        return np.unique(self.counts.index.get_level_values(1).to_numpy(dtype=float))
+
+    def histogram_bins(self, nbins=30):
+        return counts_histogram(self.counts, nbins)
+
+    def box_summary(self):
+        return counts_box_summary(self.counts, self.by)
+
+
+# --- Streamed summary ---
+class BookingSummary:
+    def __init__(self):
+        self.rows = 0
+        self.cube = None
+        self.sketches = None
+        self.corr = None
+        self.numeric_columns = None
+
+    def update(self, chunk):
+        if self.numeric_columns is None:
+            self.numeric_columns = chunk.select_dtypes(include=[np.number]).columns.tolist()
+            self.sketches = {c: ColumnSketch(c) for c in self.numeric_columns}
+            self.corr = CorrelationSums(self.numeric_columns, by=CORR_DIMENSIONS)
+        chunk_cube = build_cube(chunk, row_offset=self.rows)
+        self.cube = chunk_cube if self.cube is None else merge_cubes(self.cube, chunk_cube)
+        for sketch in self.sketches.values():
+            sketch.update(chunk)
+        self.corr.update(chunk)
+        self.rows += len(chunk)
+        return self
+
+
+def summarize_bookings(path=CSV_PATH, chunksize=STREAM_CHUNK_ROWS):
+    summary = BookingSummary()
+    for chunk in iter_booking_chunks(path, chunksize):
+        summary.update(chunk)
+    return summary
+
+
+def stream_binned_scatter(summary, x, y, path=CSV_PATH, chunksize=STREAM_CHUNK_ROWS,
+                          by='booking_status', max_bins=60):
+    # Second pass over the file for one X/Y pair; the bin edges come from the
+    # sketches so every chunk is counted into the same grid
+    x_edges = bin_edges(summary.sketches[x].distinct_values(), max_bins)
+    y_edges = bin_edges(summary.sketches[y].distinct_values(), max_bins)
+    labels = np.sort(summary.sketches[x].counts.index.get_level_values(0).unique())
+    counts = np.zeros(len(labels) * (len(x_edges) - 1) * (len(y_edges) - 1), dtype=np.int64)
+    for chunk in iter_booking_chunks(path, chunksize):
+        counts += scatter_cell_counts(chunk, x, y, x_edges, y_edges, by, labels)
+    return scatter_cells(counts, x, y, x_edges, y_edges, by, labels)
+
+
+def stream_rank_correlation(summary, path=CSV_PATH, chunksize=STREAM_CHUNK_ROWS):
+    # Spearman in two passes: midranks come from the sketches' value counts,
+    # then the chunks are mapped onto them and fed through CorrelationSums.
+    # Exact unless a sketch had to coarsen its values.
+    columns = summary.numeric_columns
+    tables = {}
+    for col in columns:
+        sketch = summary.sketches[col]
+        totals = sketch.counts.groupby(level=1).sum().sort_index()
+        tables[col] = (totals.index.to_numpy(dtype=float), midrank_table(totals.to_numpy()), sketch.step)
+    corr = CorrelationSums(columns)
+    for chunk in iter_booking_chunks(path, chunksize):
+        ranks = {}
+        for col, (values, midranks, step) in tables.items():
+            v = chunk[col].to_numpy(dtype=float)
+            if step is not None:
+                v = np.round(v / step) * step
+            pos = np.clip(np.searchsorted(values, v), 0, len(values) - 1)
+            ranks[col] = np.where(np.isfinite(v), midranks[pos], np.nan)
+        corr.update(pd.DataFrame(ranks))
+    return corr.matrix()
@@ -1,9 +1,15 @@
 import streamlit as st 
 import plotly.express as px 
-import pandas as pd 
+import plotly.graph_objects as go
 import numpy as np
+import os
 import warnings
 from PIL import Image
+from booking_store import BookingStore, FrameHandle
+from figure_cache import cached_figure
+from panel_metrics import METRICS, serve_metrics
+from booking_aggregates import (cube_counts, cube_kpis, binned_scatter, stratified_sample,
+    histogram_bins, box_summary)
 warnings.filterwarnings('ignore') 
 
 # --- Streamlit Configuration (REDUCED VERTICAL SPACE) ---
@@ -13,21 +19,50 @@ st.markdown('<style>div.block-container{padding-top:1rem; padding-bottom:1rem;}<
 st.markdown('<style>h1, h2, h3, h4{margin-top: 0.5rem; margin-bottom: 0.5rem;}</style>', unsafe_allow_html=True)
 
 # --- Data Loading ---
-@st.cache_data
-def load_data(): 
-    df = pd.read_csv('customer_booking.csv', encoding='latin1')    
-    df['booking_status'] = df['booking_complete'].map({0: 'Incomplete', 1: 'Complete'})
-    df['has_baggage'] = df['wants_extra_baggage'].map({0: 'No', 1: 'Yes'})
-    df['has_preferred_seat'] = df['wants_preferred_seat'].map({0: 'No', 1: 'Yes'})
-    df['has_in_flight_meals'] = df['wants_in_flight_meals'].map({0: 'No', 1: 'Yes'})
-    day_order = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
-    df['flight_day'] = pd.Categorical(df['flight_day'], categories=day_order, ordered=True)
-    df = df[df['purchase_lead'] >= 0]
-    df = df[df['length_of_stay'] >= 0]
-    return df
+# Bookings source: the CSV, or a directory/glob of partition CSVs loaded in parallel
+BOOKING_SOURCE = os.environ.get('BOOKING_SOURCE', 'customer_booking.csv')
+
+# One store per process: it reloads from the columnar snapshot in .booking_cache/
+# and folds in rows appended to the CSV (or files in booking_batches/) on refresh()
+@st.cache_resource
+def booking_store():
+    return BookingStore(BOOKING_SOURCE)
+
+# A fragment rerun keeps the version of the last full run. If other sessions
+# have since refreshed past it and it was pruned from the store, rerun the
+# whole app so every panel moves to the current version together.
+def booking_version(version):
+    try:
+        return booking_store().get(version)
+    except KeyError:
+        st.rerun(scope='app')
+
+# The frame and cube are shared, not copied per rerun: handles are cached as
+# resources and every load_data()/load_cube() call gets a shallow view of them
+@st.cache_resource(max_entries=2)
+def booking_frame(version):
+    return FrameHandle(booking_version(version).df)
+
+def load_data(version): 
+    return booking_frame(version).frame
+
+# Aggregate cube behind the KPI tiles and count charts, maintained per data version
+@st.cache_resource(max_entries=2)
+def cube_frame(version):
+    return FrameHandle(booking_version(version).cube)
+
+def load_cube(version):
+    return cube_frame(version).frame
+serve_metrics()
 data_load_state = st.text('Loading data...')
-df = load_data()
-data_load_state.text("Data loaded successfully! (using st.cache_data)") 
+with METRICS.section('load') as load_section:
+    store = booking_store()
+    store.refresh()
+    version = store.version
+    df = load_data(version)
+    cube = load_cube(version)
+    load_section.rows = len(df)
+data_load_state.text("Data loaded successfully! (using st.cache_resource)") 
 
 # --- Header (Logo and Title - COMPACTED) ---
 
@@ -71,14 +106,16 @@ with col3:
 st.header("✈️ British Airways Overview")
 
 # --- Core Metrics (CONDENSED) ---
-# Calculations
-longest_flight_duration = df['flight_duration'].max()
-shortest_flight_duration = df['flight_duration'].min()
-longest_route = df.loc[df['flight_duration'].idxmax(), 'route']
-shortest_route = df.loc[df['flight_duration'].idxmin(), 'route']
-completion_rate = df['booking_complete'].mean() * 100
-most_travelled_route = df['route'].value_counts().idxmax()
-total_bookings = len(df)
+# Calculations (served from the aggregate cube)
+with METRICS.section('kpis', rows=len(cube)):
+    kpis = cube_kpis(cube)
+longest_flight_duration = kpis['longest_flight_duration']
+shortest_flight_duration = kpis['shortest_flight_duration']
+longest_route = kpis['longest_route']
+shortest_route = kpis['shortest_route']
+completion_rate = kpis['completion_rate']
+most_travelled_route = kpis['most_travelled_route']
+total_bookings = kpis['total_bookings']
 
 col_a, col_b, col_c, col_d, col_e = st.columns(5)
 
@@ -89,9 +126,9 @@ with col_b:
 with col_c: 
     st.metric(label="Most Travelled Route", value=f"{most_travelled_route}")
 with col_d:
-    st.metric(label="Longest Flight (hrs)", value=f"{longest_flight_duration}", delta=f"{longest_route}")
+    st.metric(label="Longest Flight (hrs)", value=f"{longest_flight_duration:g}", delta=f"{longest_route}")
 with col_e:
-    st.metric(label="Shortest Flight (hrs)", value=f"{shortest_flight_duration}", delta=f"{shortest_route}")
+    st.metric(label="Shortest Flight (hrs)", value=f"{shortest_flight_duration:g}", delta=f"{shortest_route}")
 
 # Soft gray divider line
 st.markdown(
@@ -101,12 +138,12 @@ st.markdown(
     unsafe_allow_html=True
 ) 
 
-# --- Geographical and Route Analysis (SIDE-BY-SIDE) ---
-col_map, col_route = st.columns([2, 1])
-
-with col_map:
-    st.subheader("Bookings by Originating Country")
-    map_df = df['booking_origin'].value_counts().reset_index()
+# --- Panel Figures (cached per data version / widget value) ---
+# Panels with their own selectbox run as fragments, so a widget change only
+# reruns and re-sends that panel.
+@cached_figure()
+def map_figure(version):
+    map_df = cube_counts(load_cube(version), 'booking_origin').reset_index()
     map_df.columns = ['booking_origin', 'Total_Bookings']
     fig_map = px.choropleth(
         map_df, locations="booking_origin", locationmode='country names', 
@@ -119,24 +156,11 @@ with col_map:
         height=400, # Reduced height
         margin={"r":0, "t":40, "l":0, "b":0}, coloraxis_colorbar_title="Bookings"
     )
-    st.plotly_chart(fig_map, use_container_width=True)
-
-with col_route:
-    st.subheader('Flight Routes Overview')
-    st.markdown("##### Top Route Counts")
-    route_counts = df['route'].value_counts().head(10) # Showing top 10 for better fit
-    st.bar_chart(route_counts, height=360) # Matched map height
+    return fig_map
 
-
-# --- Multi-Plot Analysis (THREE COLUMNS - Heatmap Replaced) ---
-
-col1, col2, col3 = st.columns([1, 1, 1])
-numeric_cols = df.select_dtypes(include=['int64', 'float64']).columns.tolist()
-
-with col1:
-    st.subheader('Distribution of Bookings')
-    st.markdown("##### Origin Breakdown")
-    booking_counts = df['booking_origin'].value_counts().reset_index()
+@cached_figure()
+def pie_figure(version):
+    booking_counts = cube_counts(load_cube(version), 'booking_origin').reset_index()
     booking_counts.columns = ['booking_origin', 'Total_Bookings']
     fig = px.pie(
         booking_counts.head(10), # Show top 10 for clarity and compactness
@@ -146,12 +170,96 @@ with col1:
     )
     fig.update_traces(textposition='inside', textinfo='percent') # Removed label for compactness
     fig.update_layout(showlegend=True, height=350, margin=dict(t=30, b=0, l=0, r=0)) # Reduced height
-    st.plotly_chart(fig, use_container_width=True)
+    return fig
 
-with col2: 
-    st.subheader('Scatter Plots: Relationship Finder')
-    st.markdown("##### Select Axes:")
-    
+# Above this many bookings the scatter is binned server-side (Density) or sampled
+SCATTER_POINT_LIMIT = 5000
+SCATTER_MODES = ['Density', 'Sampled points']
+
+@cached_figure()
+def scatter_figure(version, selected_col_x, selected_col_y, mode):
+    df = load_data(version)
+    if len(df) > SCATTER_POINT_LIMIT and mode == 'Density':
+        fig_scatter = px.scatter(
+            binned_scatter(df, selected_col_x, selected_col_y), x=selected_col_x, y=selected_col_y,
+            color='booking_status', size='count', size_max=25,
+            color_discrete_map={'Complete': '#0072B2', 'Incomplete': '#D55E00'}, 
+            opacity=0.6,
+            title=f"{selected_col_x} vs {selected_col_y} (binned)",
+            template="plotly_white",
+            height=350, # Reduced height
+            hover_data=['count']
+        )
+    else:
+        points = stratified_sample(df, 'booking_status', SCATTER_POINT_LIMIT)
+        fig_scatter = px.scatter(
+            points, x=selected_col_x, y=selected_col_y,
+            color='booking_status', 
+            color_discrete_map={'Complete': '#0072B2', 'Incomplete': '#D55E00'}, 
+            opacity=0.6,
+            title=f"{selected_col_x} vs {selected_col_y}",
+            template="plotly_white",
+            height=350, # Reduced height
+            hover_data=['route', 'booking_origin']
+        )
+    fig_scatter.update_layout(xaxis_title=selected_col_x, yaxis_title=selected_col_y, legend_title="Status")
+    return fig_scatter
+
+@cached_figure()
+def day_figure(version):
+    day_counts = cube_counts(load_cube(version), 'flight_day', sort=False).reset_index()
+    day_counts.columns = ['flight_day', 'Total_Bookings']
+
+    fig_day = px.bar(
+        day_counts,
+        x='flight_day', y='Total_Bookings',
+        color='flight_day',
+        color_discrete_sequence=px.colors.qualitative.T10,
+        title='Bookings by Day of the Week',
+        template='plotly_white',
+        height=350 # Matched height of other plots in this row
+    )
+    fig_day.update_layout(xaxis_title="Flight Day", yaxis_title="Total Bookings", showlegend=False)
+    return fig_day
+
+# Histogram bins and box-plot summaries are computed server-side, so these
+# figures carry a few dozen numbers instead of the raw column
+@cached_figure()
+def histogram_figure(version, selected_col_hist):
+    fig_hist = px.bar(
+        histogram_bins(load_data(version)[selected_col_hist], nbins=30), x='bin_center', y='count',
+        hover_data=['bin_start', 'bin_end'],
+        title=f"Distribution of {selected_col_hist}",
+        template="plotly_white", color_discrete_sequence=['#0072B2'],
+        height=350 
+    )
+    fig_hist.update_layout(xaxis_title=selected_col_hist, yaxis_title="Frequency", bargap=0.1)
+    return fig_hist
+
+@cached_figure()
+def box_figure(version, selected_box_col):
+    colors = {'Complete': '#0072B2', 'Incomplete': '#D55E00'}
+    fig_box = go.Figure()
+    for row in box_summary(load_data(version), selected_box_col).itertuples():
+        status = row.booking_status
+        fig_box.add_trace(go.Box(
+            name=status, x=[status], q1=[row.q1], median=[row.median], q3=[row.q3],
+            lowerfence=[row.lowerfence], upperfence=[row.upperfence], mean=[row.mean],
+            marker_color=colors.get(status), legendgroup=status, boxpoints=False
+        ))
+        fig_box.add_trace(go.Scatter(
+            x=[status] * len(row.outliers), y=row.outliers, mode='markers',
+            marker=dict(color=colors.get(status), size=4), name=f"{status} outliers",
+            legendgroup=status, showlegend=False
+        ))
+    fig_box.update_layout(
+        title=f"Box Plot of {selected_box_col}", template="plotly_white", height=350,
+        yaxis_title=selected_box_col, xaxis_title="Booking Status", showlegend=True
+    )
+    return fig_box
+
+@st.fragment
+def scatter_panel():
     col_x, col_y = st.columns(2)
 
     purchase_lead_idx = numeric_cols.index('purchase_lead') if 'purchase_lead' in numeric_cols else 0
@@ -162,38 +270,69 @@ with col2:
     with col_y:
         selected_col_y = st.selectbox("Y-axis:", numeric_cols, index=length_of_stay_idx, key='scatter_y')
 
-    fig_scatter = px.scatter(
-        df, x=selected_col_x, y=selected_col_y,
-        color='booking_status', 
-        color_discrete_map={'Complete': '#0072B2', 'Incomplete': '#D55E00'}, 
-        opacity=0.6,
-        title=f"{selected_col_x} vs {selected_col_y}",
-        template="plotly_white",
-        height=350, # Reduced height
-        hover_data=['route', 'booking_origin']
+    mode = SCATTER_MODES[0]
+    if len(df) > SCATTER_POINT_LIMIT:
+        mode = st.radio("Scatter mode:", SCATTER_MODES, horizontal=True, key='scatter_mode')
+
+    with METRICS.section('scatter', rows=len(df)) as panel:
+        panel.chart(scatter_figure(version, selected_col_x, selected_col_y, mode), use_container_width=True)
+
+@st.fragment
+def histogram_panel():
+    selected_col_hist = st.selectbox(
+        "Select distribution variable:", 
+        numeric_cols, 
+        index=numeric_cols.index('purchase_lead') if 'purchase_lead' in numeric_cols else 0,
+        key='hist_final_select'
     )
-    fig_scatter.update_layout(xaxis_title=selected_col_x, yaxis_title=selected_col_y, legend_title="Status")
-    st.plotly_chart(fig_scatter, use_container_width=True)
+    with METRICS.section('histogram', rows=len(df)) as panel:
+        panel.chart(histogram_figure(version, selected_col_hist), use_container_width=True)
+
+@st.fragment
+def box_panel():
+    selected_box_col = st.selectbox("Select variable for box plot:", numeric_cols, key='box_final_select')
+    with METRICS.section('box', rows=len(df)) as panel:
+        panel.chart(box_figure(version, selected_box_col), use_container_width=True)
+
+
+# --- Geographical and Route Analysis (SIDE-BY-SIDE) ---
+col_map, col_route = st.columns([2, 1])
+
+with col_map:
+    st.subheader("Bookings by Originating Country")
+    with METRICS.section('map') as panel:
+        panel.chart(map_figure(version), use_container_width=True)
+
+with col_route:
+    st.subheader('Flight Routes Overview')
+    st.markdown("##### Top Route Counts")
+    with METRICS.section('route_counts', rows=len(cube)):
+        route_counts = cube_counts(cube, 'route').head(10) # Showing top 10 for better fit
+        st.bar_chart(route_counts, height=360) # Matched map height
+
+
+# --- Multi-Plot Analysis (THREE COLUMNS - Heatmap Replaced) ---
+
+col1, col2, col3 = st.columns([1, 1, 1])
+numeric_cols = df.select_dtypes(include=[np.number]).columns.tolist()
+
+with col1:
+    st.subheader('Distribution of Bookings')
+    st.markdown("##### Origin Breakdown")
+    with METRICS.section('pie') as panel:
+        panel.chart(pie_figure(version), use_container_width=True)
+
+with col2: 
+    st.subheader('Scatter Plots: Relationship Finder')
+    st.markdown("##### Select Axes:")
+    scatter_panel()
     
 # --- REPLACEMENT FOR HEATMAP: DAY/TIME ANALYSIS ---
 with col3:
     st.subheader('Day/Time Analysis')
     st.markdown("##### Bookings Count by Flight Day")
-    
-    day_counts = df['flight_day'].value_counts().sort_index().reset_index()
-    day_counts.columns = ['flight_day', 'Total_Bookings']
-
-    fig_day = px.bar(
-        day_counts,
-        x='flight_day', y='Total_Bookings',
-        color='flight_day',
-        color_discrete_sequence=px.colors.qualitative.T10,
-        title='Bookings by Day of the Week',
-        template='plotly_white',
-        height=350 # Matched height of other plots in this row
-    )
-    fig_day.update_layout(xaxis_title="Flight Day", yaxis_title="Total Bookings", showlegend=False)
-    st.plotly_chart(fig_day, use_container_width=True)
+    with METRICS.section('day') as panel:
+        panel.chart(day_figure(version), use_container_width=True)
 
 
 # --- Distribution and Outlier Analysis (SIDE-BY-SIDE) ---
@@ -209,34 +348,13 @@ col_hist, col_box = st.columns(2) # Reduced to two columns
 with col_hist:
     st.subheader("Distribution Analysis")
     st.markdown("##### Histogram of Selected Entity")
-    selected_col_hist = st.selectbox(
-        "Select distribution variable:", 
-        numeric_cols, 
-        index=numeric_cols.index('purchase_lead') if 'purchase_lead' in numeric_cols else 0,
-        key='hist_final_select'
-    )
-    
-    fig_hist = px.histogram(
-        df, x=selected_col_hist, nbins=30,
-        title=f"Distribution of {selected_col_hist}",
-        template="plotly_white", color_discrete_sequence=['#0072B2'],
-        height=350 
-    )
-    fig_hist.update_layout(xaxis_title=selected_col_hist, yaxis_title="Frequency", bargap=0.1)
-    st.plotly_chart(fig_hist, use_container_width=True)
+    histogram_panel()
 
 with col_box:
     st.subheader("Outlier Analysis")
     st.markdown("##### Box Plot by Booking Status")
     # Box Plot 
-    selected_box_col = st.selectbox("Select variable for box plot:", numeric_cols, key='box_final_select')
+    box_panel()
 
-    fig_box = px.box(
-        df, y=selected_box_col, color='booking_status',
-        color_discrete_map={'Complete': '#0072B2', 'Incomplete': '#D55E00'},
-        title=f"Box Plot of {selected_box_col}",
-        template="plotly_white",
-        height=350 
-    )
-    fig_box.update_layout(yaxis_title=selected_box_col, xaxis_title="Booking Status", showlegend=True)
-    st.plotly_chart(fig_box, use_container_width=True)
\ No newline at end of file
+METRICS.sidebar()
+METRICS.flush()
@@ -1,9 +1,19 @@
 import streamlit as st 
 import plotly.express as px 
-import pandas as pd 
+import plotly.graph_objects as go
 import numpy as np
 import time
+import os
 from PIL import Image
+from booking_data import data_version, DAY_ORDER
+from booking_store import BookingStore, FrameHandle
+from booking_stream import summarize_bookings, stream_binned_scatter, stream_rank_correlation
+from booking_aggregates import (cube_counts, cube_kpis, cube_where, counts_histogram, counts_box_summary,
+    CompletionDrilldown, CUBE_DIMENSIONS, DRILLDOWN_DIMENSIONS)
+from booking_index import BookingIndex
+from booking_query import make_engine, resolve_engine, source_version
+from figure_cache import cached_figure
+from panel_metrics import METRICS, serve_metrics
 import warnings
 warnings.filterwarnings('ignore') 
 
@@ -12,23 +22,146 @@ st.set_page_config(layout = 'wide')
 st.markdown('<style>div.block-container{padding-top:1rem;}</style>', unsafe_allow_html=True)
 
 # Data Loading
-@st.cache_data
-def load_data(): 
-    df = pd.read_csv('customer_booking.csv', encoding='latin1')    
-    df['booking_status'] = df['booking_complete'].map({0: 'Incomplete', 1: 'Complete'})
-    df['has_baggage'] = df['wants_extra_baggage'].map({0: 'No', 1: 'Yes'})
-    df['has_preferred_seat'] = df['wants_preferred_seat'].map({0: 'No', 1: 'Yes'})
-    df['has_in_flight_meals'] = df['wants_in_flight_meals'].map({0: 'No', 1: 'Yes'})
-    day_order = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
-    df['flight_day'] = pd.Categorical(df['flight_day'], categories=day_order, ordered=True)
-    # Basic data cleaning: handle outliers in lead time and stay duration
-    df = df[df['purchase_lead'] >= 0]
-    df = df[df['length_of_stay'] >= 0]
-    return df
+# BOOKING_STREAMING=1 switches to out-of-core mode for exports larger than RAM:
+# the CSV is read in chunks and every panel renders from streamed aggregates
+STREAMING = os.environ.get('BOOKING_STREAMING') == '1'
+# Bookings source: the CSV, or a directory/glob of partition CSVs loaded in parallel
+BOOKING_SOURCE = os.environ.get('BOOKING_SOURCE', 'customer_booking.csv')
+# Engine behind every filtered panel: pandas (in-memory store), or duckdb / polars
+# scanning the source files, in which case the booking frame is never loaded
+# (see booking_query.py)
+REQUESTED_ENGINE = os.environ.get('BOOKING_QUERY_ENGINE', 'pandas')
+QUERY_ENGINE = resolve_engine(REQUESTED_ENGINE)
+SCAN_ENGINE = QUERY_ENGINE != 'pandas' and not STREAMING
+
+# One store per process: it reloads from the columnar snapshot in .booking_cache/
+# and folds in rows appended to the CSV (or files in booking_batches/) on refresh()
+@st.cache_resource
+def booking_store():
+    return BookingStore(BOOKING_SOURCE)
+
+# A fragment rerun keeps the version of the last full run. If other sessions
+# have since refreshed past it and it was pruned from the store, rerun the
+# whole app so every panel moves to the current version together.
+def booking_version(version):
+    try:
+        return booking_store().get(version)
+    except KeyError:
+        st.rerun(scope='app')
+
+# The frame and cube are shared, not copied per rerun: handles are cached as
+# resources and every load_data()/load_cube() call gets a shallow view of them
+@st.cache_resource(max_entries=2)
+def booking_frame(version):
+    return FrameHandle(booking_version(version).df)
+
+def load_data(version): 
+    return booking_frame(version).frame
+
+@st.cache_resource(max_entries=2)
+def booking_summary(version):
+    return summarize_bookings(BOOKING_SOURCE)
+
+# Aggregate cube behind the KPI tiles and count charts, maintained per data version
+@st.cache_resource(max_entries=2)
+def cube_frame(version):
+    return FrameHandle(booking_summary(version).cube if STREAMING else query_engine(version).cube())
+
+def load_cube(version):
+    return cube_frame(version).frame
+
+# One engine per data version; the pandas engine resolves filters through the
+# bitmap index below (filter_mask)
+@st.cache_resource(max_entries=2)
+def query_engine(version):
+    if SCAN_ENGINE:
+        return make_engine(QUERY_ENGINE, BOOKING_SOURCE)
+    loaded = booking_version(version)
+    return make_engine('pandas', df=load_data(version), cube=loaded.cube, corr=loaded.corr,
+                       mask=lambda filters: filter_mask(version, filters))
+# Per-panel timings (BOOKING_METRICS=1, see panel_metrics.py)
+serve_metrics()
 # --- CRITICAL FIX: Call the function and assign its return value to df ---
 data_load_state = st.text('Loading data...')
-df = load_data()
-data_load_state.text("Data loaded successfully! (using st.cache_data)") 
+with METRICS.section('load') as load_section:
+    if STREAMING:
+        version = data_version(BOOKING_SOURCE)
+        summary = booking_summary(version)
+        df = None
+        total_rows = summary.rows
+        numeric_cols = summary.numeric_columns
+    elif SCAN_ENGINE:
+        version = source_version(BOOKING_SOURCE)
+        df = None
+        total_rows = int(load_cube(version)['bookings'].sum())
+        numeric_cols = query_engine(version).numeric_columns()
+    else:
+        store = booking_store()
+        store.refresh()
+        # Everything below is keyed by this version and reads it via store.get()
+        version = store.current.version
+        df = load_data(version)
+        total_rows = len(df)
+        numeric_cols = df.select_dtypes(include=[np.number]).columns.tolist()
+    load_section.rows = total_rows
+data_load_state.text("Data loaded successfully! (using st.cache_resource)") 
+
+# Sidebar filters
+# Resolved through per-value bitmap indexes built once per data version; every
+# panel below renders from the filtered view. Empty selections mean "all".
+# The newest index; the next version only indexes its appended rows on top of it
+@st.cache_resource
+def latest_index():
+    return {}
+
+@st.cache_resource(max_entries=2)
+def booking_index(version):
+    latest = latest_index()
+    base_version, base = latest.get('entry', (None, None))
+    if not booking_store().extends(base_version, version):
+        base = None
+    index = BookingIndex(load_data(version), base=base)
+    latest['entry'] = (version, index)
+    return index
+
+@st.cache_resource(max_entries=16)
+def filter_mask(version, filters):
+    return booking_index(version).mask(filters)
+
+@st.cache_resource(max_entries=16)
+def filtered_cube_frame(version, filters):
+    return FrameHandle(cube_where(load_cube(version), filters))
+
+def filtered_cube(version, filters):
+    return filtered_cube_frame(version, filters).frame
+
+st.sidebar.header("Filters")
+if QUERY_ENGINE != REQUESTED_ENGINE:
+    st.sidebar.caption(f"Query engine '{REQUESTED_ENGINE}' is not available; using pandas.")
+filters = []
+if STREAMING:
+    st.sidebar.caption("Filters are not available in streaming mode.")
+else:
+    full_cube = load_cube(version)
+    options = {
+        'route': sorted(full_cube['route'].dropna().unique()),
+        'booking_origin': sorted(full_cube['booking_origin'].dropna().unique()),
+        'sales_channel': full_cube['sales_channel'].cat.categories.tolist(),
+        'trip_type': full_cube['trip_type'].cat.categories.tolist(),
+        'flight_day': DAY_ORDER,
+    }
+    for col, values in options.items():
+        selected = st.sidebar.multiselect(col.replace('_', ' ').title(), values)
+        if selected:
+            filters.append((col, tuple(selected)))
+    hour_range = st.sidebar.slider("Flight Hour", 0, 23, (0, 23))
+    if hour_range != (0, 23):
+        filters.append(('flight_hour', tuple(range(hour_range[0], hour_range[1] + 1))))
+filters = tuple(filters)
+with METRICS.section('filters', rows=total_rows):
+    cube = filtered_cube(version, filters)
+if not STREAMING:
+    total_rows = int(cube['bookings'].sum())
 
 # Header (Logo and Title)
 
@@ -74,44 +207,46 @@ with col3:
         st.image(airbus_image, width=200)
 
 
-# Core metrics
-most_travelled_route = df['route'].value_counts().idxmax()
-route_count = df['route'].value_counts().max()
+if cube.empty:
+    st.warning("No bookings match the selected filters.")
+    st.stop()
 
-# Find longest and shortest flights
-longest_flight_duration = df['flight_duration'].max()
-shortest_flight_duration = df['flight_duration'].min()
+# Core metrics (served from the aggregate cube)
+with METRICS.section('kpis', rows=len(cube)):
+    kpis = cube_kpis(cube)
+most_travelled_route = kpis['most_travelled_route']
+route_count = kpis['route_count']
 
-# Find the corresponding routes
-longest_route = df.loc[df['flight_duration'].idxmax(), 'route']
-shortest_route = df.loc[df['flight_duration'].idxmin(), 'route']
+# Find longest and shortest flights and the corresponding routes
+longest_flight_duration = kpis['longest_flight_duration']
+shortest_flight_duration = kpis['shortest_flight_duration']
+longest_route = kpis['longest_route']
+shortest_route = kpis['shortest_route']
 
 # Completion rate
-completion_rate = df['booking_complete'].mean() * 100
-
-most_travelled_route = df['route'].value_counts().idxmax()
+completion_rate = kpis['completion_rate']
 
-avg_passengers = df['num_passengers'].mean()
+avg_passengers = kpis['avg_passengers']
 # Layout columns
 col_a, col_b, col_c, col_d, col_e= st.columns(5)
 
 with col_a:
     st.metric(
         label="Total Bookings",
-        value=f"{len(df):,}"
+        value=f"{kpis['total_bookings']:,}"
     )
 
 with col_b:
     st.metric(
         label="Longest Flight",
-        value=f"{longest_flight_duration} hrs",
+        value=f"{longest_flight_duration:g} hrs",
         delta=f"{longest_route}"
     )
 
 with col_c:
     st.metric(
         label="Shortest Flight",
-        value=f"{shortest_flight_duration} hrs",
+        value=f"{shortest_flight_duration:g} hrs",
         delta=f"{shortest_route}"
     )
 
@@ -128,77 +263,74 @@ with col_e:
 
 
 
-st.subheader("Map of Flight Bookings")
-map_df = df['booking_origin'].value_counts().reset_index()
-map_df.columns = ['booking_origin', 'Total_Bookings']
-fig_map = px.choropleth(
-    map_df,
-    locations="booking_origin",
-    locationmode='country names', 
-    color="Total_Bookings",
-    hover_name="booking_origin",
-    color_continuous_scale=px.colors.sequential.Plasma,
-    title='Total Bookings by Originating Country',
-    template="streamlit"
-)
-
-# Customize map appearance
-fig_map.update_geos(
-    showcoastlines=True,
-    coastlinecolor="Black",
-    showland=True,
-    landcolor="white",
-    showocean=True,
-    oceancolor="lightblue",
-    showcountries=True,
-    countrycolor="Black"
-)
-
-fig_map.update_layout(
-    height=500,
-    margin={"r":0, "t":40, "l":0, "b":0},
-    coloraxis_colorbar_title="Bookings"
-)
-
-st.plotly_chart(fig_map, use_container_width=True)
+# Panel figures are built once per data version (and widget value) and reused
+# across reruns and sessions from a size-capped LRU cache (figure_cache.py);
+# panels with their own selectbox run as fragments, so changing one only
+# reruns and re-sends that panel.
+@cached_figure()
+def map_figure(version, filters):
+    map_df = cube_counts(filtered_cube(version, filters), 'booking_origin').reset_index()
+    map_df.columns = ['booking_origin', 'Total_Bookings']
+    fig_map = px.choropleth(
+        map_df,
+        locations="booking_origin",
+        locationmode='country names', 
+        color="Total_Bookings",
+        hover_name="booking_origin",
+        color_continuous_scale=px.colors.sequential.Plasma,
+        title='Total Bookings by Originating Country',
+        template="streamlit"
+    )
 
-# Soft gray divider line
-st.markdown(
-    """
-    <hr style="border: 0.5px solid #888888; opacity: 0.5; margin-top: 1rem; margin-bottom: 1rem;">
-    """,
-    unsafe_allow_html=True
-) 
-st.subheader('Flight Routes of British Airways')
-route_counts = df['route'].value_counts()  
-st.bar_chart(route_counts) 
-st.subheader("📊 Distribution of Key Numeric Entities")
-numeric_cols = df.select_dtypes(include=['int64', 'float64']).columns.tolist()
-# Let user pick a column to visualize
-selected_col = st.selectbox("Select a column to view its distribution:", numeric_cols)
-# Plotly histogram
-fig_hist = px.histogram(
-    df,
-    x=selected_col,
-    nbins=30,
-    title=f"Distribution of {selected_col}",
-    template="plotly_white",
-    color_discrete_sequence=['#0072B2']
-)
-fig_hist.update_layout(
-    xaxis_title=selected_col,
-    yaxis_title="Frequency",
-    bargap=0.1,
-    height=400
-)
-st.plotly_chart(fig_hist, use_container_width=True)
-col1, col2, col3 = st.columns([1, 1, 1])
+    # Customize map appearance
+    fig_map.update_geos(
+        showcoastlines=True,
+        coastlinecolor="Black",
+        showland=True,
+        landcolor="white",
+        showocean=True,
+        oceancolor="lightblue",
+        showcountries=True,
+        countrycolor="Black"
+    )
 
-with col1:
-    st.subheader('Distribution of Bookings')
-    booking_counts = df['booking_origin'].value_counts().reset_index()
+    fig_map.update_layout(
+        height=500,
+        margin={"r":0, "t":40, "l":0, "b":0},
+        coloraxis_colorbar_title="Bookings"
+    )
+    return fig_map
+
+
+@cached_figure()
+def histogram_figure(version, filters, selected_col):
+    # Bin counts are computed here; the figure only carries 30 bars
+    if STREAMING:
+        bins = booking_summary(version).sketches[selected_col].histogram_bins(nbins=30)
+    else:
+        bins = counts_histogram(query_engine(version).value_counts(selected_col, filters), nbins=30)
+    fig_hist = px.bar(
+        bins,
+        x='bin_center',
+        y='count',
+        hover_data=['bin_start', 'bin_end'],
+        title=f"Distribution of {selected_col}",
+        template="plotly_white",
+        color_discrete_sequence=['#0072B2']
+    )
+    fig_hist.update_layout(
+        xaxis_title=selected_col,
+        yaxis_title="Frequency",
+        bargap=0.1,
+        height=400
+    )
+    return fig_hist
+
+
+@cached_figure()
+def pie_figure(version, filters):
+    booking_counts = cube_counts(filtered_cube(version, filters), 'booking_origin').reset_index()
     booking_counts.columns = ['booking_origin', 'Total_Bookings']
-    # Plot pie chart
     fig = px.pie(
         booking_counts,
         values='Total_Bookings',
@@ -207,163 +339,299 @@ with col1:
     )
     fig.update_traces(textposition='inside', textinfo='percent+label')
     fig.update_layout(showlegend=True)
-    st.plotly_chart(fig, use_container_width=True)
-
-with col2: 
-    st.subheader('Scatter Plots')
-    numeric_cols = df.select_dtypes(include=['int64', 'float64']).columns.tolist()
-
-
-    # 2. Allow user to pick two columns for X and Y axes
-    col_x, col_y = st.columns(2)
-
-    with col_x:
-        selected_col_x = st.selectbox(
-            "Select X-axis variable:",
-            numeric_cols,
-            index=numeric_cols.index('purchase_lead') if 'purchase_lead' in numeric_cols else 0
+    return fig
+
+
+# Above this many bookings the scatter panel stops sending one marker per row:
+# it either bins the points server-side (Density) or sends a stratified sample
+SCATTER_POINT_LIMIT = 5000
+SCATTER_MODES = ['Density', 'Sampled points']
+
+@cached_figure()
+def scatter_figure(version, filters, selected_col_x, selected_col_y, mode):
+    title = f"Relationship between {selected_col_x} and {selected_col_y}"
+    cells = None
+    if STREAMING:
+        # Raw points are never materialised in streaming mode
+        cells = stream_binned_scatter(booking_summary(version), selected_col_x, selected_col_y, BOOKING_SOURCE)
+    else:
+        engine = query_engine(version)
+        rows = int(filtered_cube(version, filters)['bookings'].sum())
+        if rows > SCATTER_POINT_LIMIT and mode == 'Density':
+            cells = engine.binned_scatter(selected_col_x, selected_col_y, filters)
+    if cells is not None:
+        # One marker per occupied grid cell, sized by the number of bookings in it
+        fig_scatter = px.scatter(
+            cells,
+            x=selected_col_x,
+            y=selected_col_y,
+            color='booking_status',
+            color_discrete_map={'Complete': '#0072B2', 'Incomplete': '#D55E00'},
+            size='count',
+            size_max=30,
+            opacity=0.6,
+            title=f"{title} (binned)",
+            template="plotly_white",
+            height=500,
+            hover_data=['count']
         )
-
-    with col_y:
-        # Prevent selecting the same column for both, if possible
-        default_y_index = numeric_cols.index('length_of_stay') if 'length_of_stay' in numeric_cols else (1 if len(numeric_cols) > 1 else 0)
-        selected_col_y = st.selectbox(
-            "Select Y-axis variable:",
-            numeric_cols,
-            index=default_y_index
+    else:
+        columns = list(dict.fromkeys([selected_col_x, selected_col_y, 'booking_status', 'route', 'booking_origin']))
+        points = engine.sample(columns, filters, SCATTER_POINT_LIMIT)
+        fig_scatter = px.scatter(
+            points,
+            x=selected_col_x,
+            y=selected_col_y,
+            # Color the points by the booking status for better insight
+            color='booking_status', 
+            color_discrete_map={'Complete': '#0072B2', 'Incomplete': '#D55E00'}, # Adjusted colors
+            opacity=0.6,
+            title=title if len(points) == rows else f"{title} ({len(points):,} sampled)",
+            template="plotly_white",
+            height=500,
+            hover_data=['route', 'booking_origin'] # Add relevant hover info
         )
 
-    # 3. Plotly Scatter Plot
-    fig_scatter = px.scatter(
-        df,
-        x=selected_col_x,
-        y=selected_col_y,
-        # Color the points by the booking status for better insight
-        color='booking_status', 
-        color_discrete_map={'Complete': '#0072B2', 'Incomplete': '#D55E00'}, # Adjusted colors
-        opacity=0.6,
-        title=f"Relationship between {selected_col_x} and {selected_col_y}",
-        template="plotly_white",
-        height=500,
-        hover_data=['route', 'booking_origin'] # Add relevant hover info
-    )
-    
     # Customize layout and axes
     fig_scatter.update_layout(
         xaxis_title=selected_col_x,
         yaxis_title=selected_col_y,
         legend_title="Booking Status"
     )
+    return fig_scatter
 
-    st.plotly_chart(fig_scatter, use_container_width=True)
-with col3:
-    st.subheader('Feature Correlation Heatmap')
-    numeric_df = df.select_dtypes(include=[np.number])  
-    corr_matrix = numeric_df.corr(numeric_only=True)
+
+CORRELATION_METHODS = ['Pearson', 'Spearman']
+
+@cached_figure()
+def heatmap_figure(version, filters, method='Pearson'):
+    # Both methods come from the query engine (with pandas: the store's running
+    # sums for Pearson, a ranking built once per data version for Spearman)
+    if STREAMING and method == 'Spearman':
+        corr_matrix = stream_rank_correlation(booking_summary(version), BOOKING_SOURCE)
+    elif STREAMING:
+        corr_matrix = booking_summary(version).corr.matrix()
+    else:
+        corr_matrix = query_engine(version).corr(numeric_cols, filters, method)
     
     heatmap_fig = px.imshow(
         corr_matrix,
         text_auto=True,
         color_continuous_scale='Plasma',
-        title='Correlation Between Numeric Features'
+        title=f'{method} Correlation Between Numeric Features'
     )
     heatmap_fig.update_layout(
         height=400,
         margin=dict(l=0, r=0, t=40, b=0),
         template='simple_white'
     )
-    st.plotly_chart(heatmap_fig, use_container_width=True)
-
-st.subheader("Box Plot of Numeric Entities")
-
-# Select only numeric columns
-numeric_cols = df.select_dtypes(include=['int64', 'float64']).columns.tolist()
-
-# Let user pick a column to visualize
-selected_box_col = st.selectbox("Select a column to view its box plot:", numeric_cols)
-
-# Plotly box plot
-fig_box = px.box(
-    df,
-    y=selected_box_col,
-    color='booking_status',  # Color by completion status for more insight
-    color_discrete_map={'Complete': '#0072B2', 'Incomplete': '#D55E00'},
-    title=f"Box Plot of {selected_box_col} by Booking Status",
-    template="plotly_white",
-    height=400
-)
-
-fig_box.update_layout(
-    yaxis_title=selected_box_col,
-    xaxis_title="Booking Status",
-    showlegend=True
-)
-
-st.plotly_chart(fig_box, use_container_width=True)
-
-
-# Plotly histogram
-fig_hist = px.histogram(
-    df,
-    x=selected_col,
-    nbins=30,
-    title=f"Distribution of {selected_col}",
-    template="plotly_white",
-    color_discrete_sequence=['#0072B2']
-)
-fig_hist.update_layout(
-    xaxis_title=selected_col,
-    yaxis_title="Frequency",
-    bargap=0.1,
-    height=400
-)
-st.markdown("### Bookings Count by Flight Day")
-
-# Aggregate data
-day_order = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
-flight_day_counts = df.groupby('flight_day').size().reset_index(name='Total_Bookings')
-
-# Ensure correct categorical order
-flight_day_counts['flight_day'] = pd.Categorical(flight_day_counts['flight_day'], categories=day_order, ordered=True)
-flight_day_counts = flight_day_counts.sort_values('flight_day')
-
-# Create Plotly figure
-fig_day = px.bar(
-    flight_day_counts,
-    x='flight_day',
-    y='Total_Bookings',
-    color='Total_Bookings',
-    color_continuous_scale=px.colors.sequential.Teal,
-    labels={'Total_Bookings': 'Total Bookings', 'flight_day': 'Flight Day of Week'},
-    template="plotly_white"
-)
-fig_day.update_layout(height=400)  
-st.plotly_chart(fig_day)           
-
-
-
-
-
-
-
-
-
-
-
+    return heatmap_fig
+
+
+@cached_figure()
+def box_figure(version, filters, selected_box_col):
+    # Quartiles, whiskers and distinct outliers are computed here; the figure
+    # only carries the summary per booking status
+    colors = {'Complete': '#0072B2', 'Incomplete': '#D55E00'}
+    fig_box = go.Figure()
+    if STREAMING:
+        stats = booking_summary(version).sketches[selected_box_col].box_summary()
+    else:
+        stats = counts_box_summary(query_engine(version).value_counts(selected_box_col, filters))
+    for row in stats.itertuples():
+        status = row.booking_status
+        fig_box.add_trace(go.Box(
+            name=status, x=[status], q1=[row.q1], median=[row.median], q3=[row.q3],
+            lowerfence=[row.lowerfence], upperfence=[row.upperfence], mean=[row.mean],
+            marker_color=colors.get(status), legendgroup=status, boxpoints=False
+        ))
+        fig_box.add_trace(go.Scatter(
+            x=[status] * len(row.outliers), y=row.outliers, mode='markers',
+            marker=dict(color=colors.get(status), size=4), name=f"{status} outliers",
+            legendgroup=status, showlegend=False
+        ))
+
+    fig_box.update_layout(
+        title=f"Box Plot of {selected_box_col} by Booking Status",
+        template="plotly_white",
+        height=400,
+        yaxis_title=selected_box_col,
+        xaxis_title="Booking Status",
+        showlegend=True
+    )
+    return fig_box
+
+
+@cached_figure()
+def day_figure(version, filters):
+    # Aggregate data (the cube keeps flight_day in Mon..Sun category order)
+    flight_day_counts = cube_counts(filtered_cube(version, filters), 'flight_day', sort=False).reset_index(name='Total_Bookings')
+
+    fig_day = px.bar(
+        flight_day_counts,
+        x='flight_day',
+        y='Total_Bookings',
+        color='Total_Bookings',
+        color_continuous_scale=px.colors.sequential.Teal,
+        labels={'Total_Bookings': 'Total Bookings', 'flight_day': 'Flight Day of Week'},
+        template="plotly_white"
+    )
+    fig_day.update_layout(height=400)  
+    return fig_day
+
+
+# Completion drilldown: the query engine answers it (with pandas from group
+# codes built once per data version) and each (filters, dimensions) answer is
+# kept, so switching dimensions back and forth is served from cache. Streaming
+# mode drills into the cube (no add-on columns).
+@st.cache_resource(max_entries=2)
+def cube_drilldown(version):
+    return CompletionDrilldown(load_cube(version), CUBE_DIMENSIONS, bookings='bookings', completed='completed')
+
+@st.cache_resource(max_entries=64)
+def drilldown_frame(version, filters, dims):
+    if STREAMING:
+        return FrameHandle(cube_drilldown(version).table(dims))
+    return FrameHandle(query_engine(version).completion(dims, filters))
+
+DRILLDOWN_TOP = 20
+
+@cached_figure()
+def drilldown_figure(version, filters, dims):
+    top = drilldown_frame(version, filters, dims).frame.head(DRILLDOWN_TOP)
+    # One label per row; built row by row so an empty table stays a valid (empty) chart
+    labels = [' / '.join(row) for row in top[list(dims)].astype(str).itertuples(index=False)] if dims \
+        else ['All bookings'] * len(top)
+    fig_drill = px.bar(
+        top.assign(combination=labels),
+        x='combination',
+        y='bookings',
+        color='completion_rate',
+        color_continuous_scale=px.colors.sequential.Plasma,
+        hover_data=['completed'],
+        labels={'bookings': 'Bookings', 'completion_rate': 'Completion Rate (%)', 'combination': ''},
+        title=f"Top {len(top)} combinations by volume",
+        template="plotly_white"
+    )
+    fig_drill.update_layout(height=400)
+    return fig_drill
+
+
+@st.fragment
+def drilldown_panel():
+    options = CUBE_DIMENSIONS if STREAMING else DRILLDOWN_DIMENSIONS
+    dims = tuple(st.multiselect("Break completion rate down by:", options, default=['sales_channel', 'trip_type']))
+    with METRICS.section('drilldown', rows=total_rows) as panel:
+        table = drilldown_frame(version, filters, dims).frame
+        if table.empty:
+            st.info("No bookings match the current filters.")
+            return
+        col_table, col_chart = st.columns([1, 1])
+        with col_table:
+            st.dataframe(
+                table,
+                hide_index=True,
+                height=400,
+                column_config={'completion_rate': st.column_config.ProgressColumn(
+                    'Completion Rate', format='%.2f %%', min_value=0, max_value=100)}
+            )
+        with col_chart:
+            panel.chart(drilldown_figure(version, filters, dims), use_container_width=True)
+
+
+@st.fragment
+def histogram_panel():
+    # Let user pick a column to visualize
+    selected_col = st.selectbox("Select a column to view its distribution:", numeric_cols)
+    with METRICS.section('histogram', rows=total_rows) as panel:
+        panel.chart(histogram_figure(version, filters, selected_col), use_container_width=True)
+
+
+@st.fragment
+def scatter_panel():
+    # 2. Allow user to pick two columns for X and Y axes
+    col_x, col_y = st.columns(2)
 
+    with col_x:
+        selected_col_x = st.selectbox(
+            "Select X-axis variable:",
+            numeric_cols,
+            index=numeric_cols.index('purchase_lead') if 'purchase_lead' in numeric_cols else 0
+        )
 
+    with col_y:
+        # Prevent selecting the same column for both, if possible
+        default_y_index = numeric_cols.index('length_of_stay') if 'length_of_stay' in numeric_cols else (1 if len(numeric_cols) > 1 else 0)
+        selected_col_y = st.selectbox(
+            "Select Y-axis variable:",
+            numeric_cols,
+            index=default_y_index
+        )
 
+    mode = SCATTER_MODES[0]
+    if total_rows > SCATTER_POINT_LIMIT and not STREAMING:
+        mode = st.radio("Scatter mode:", SCATTER_MODES, horizontal=True)
 
+    # 3. Plotly Scatter Plot
+    with METRICS.section('scatter', rows=total_rows) as panel:
+        panel.chart(scatter_figure(version, filters, selected_col_x, selected_col_y, mode), use_container_width=True)
 
 
+@st.fragment
+def heatmap_panel():
+    method = st.radio("Correlation method:", CORRELATION_METHODS, horizontal=True)
+    with METRICS.section('heatmap', rows=total_rows) as panel:
+        panel.chart(heatmap_figure(version, filters, method), use_container_width=True)
 
 
+@st.fragment
+def box_panel():
+    # Let user pick a column to visualize
+    selected_box_col = st.selectbox("Select a column to view its box plot:", numeric_cols)
+    with METRICS.section('box', rows=total_rows) as panel:
+        panel.chart(box_figure(version, filters, selected_box_col), use_container_width=True)
 
 
+st.subheader("Map of Flight Bookings")
+with METRICS.section('map', rows=len(cube)) as panel:
+    panel.chart(map_figure(version, filters), use_container_width=True)
 
+# Soft gray divider line
+st.markdown(
+    """
+    <hr style="border: 0.5px solid #888888; opacity: 0.5; margin-top: 1rem; margin-bottom: 1rem;">
+    """,
+    unsafe_allow_html=True
+) 
+st.subheader('Flight Routes of British Airways')
+with METRICS.section('route_counts', rows=len(cube)):
+    route_counts = cube_counts(cube, 'route')
+    st.bar_chart(route_counts) 
+st.subheader("📊 Distribution of Key Numeric Entities")
+histogram_panel()
+col1, col2, col3 = st.columns([1, 1, 1])
 
+with col1:
+    st.subheader('Distribution of Bookings')
+    with METRICS.section('pie', rows=len(cube)) as panel:
+        panel.chart(pie_figure(version, filters), use_container_width=True)
 
+with col2: 
+    st.subheader('Scatter Plots')
+    scatter_panel()
+with col3:
+    st.subheader('Feature Correlation Heatmap')
+    heatmap_panel()
 
+st.subheader("Box Plot of Numeric Entities")
+box_panel()
 
+st.markdown("### Bookings Count by Flight Day")
+with METRICS.section('day', rows=len(cube)) as panel:
+    panel.chart(day_figure(version, filters))
 
+st.markdown("### Completion Rate Drilldown")
+drilldown_panel()
 
+METRICS.sidebar()
+METRICS.flush()
@@ -0,0 +1,74 @@
+import functools
+import os
+import threading
+from collections import OrderedDict
+
+# Process-wide cache of built Plotly figures for the dashboards, keyed by
+# (panel id, data version, widget values). Entries are evicted least recently
+# used first once their combined JSON size passes the cap, so the many scatter
+# axis combinations can't grow it without bound.
+
+FIGURE_CACHE_BYTES = int(os.environ.get('FIGURE_CACHE_MB', 64)) * 1024 * 1024
+# Plotly resolves template defaults through shared, lazily-built objects that
+# two threads can't read at once (concurrent sessions building figures fail
+# with "ValueError: Invalid value"), so figures are built one at a time
+BUILD_LOCK = threading.Lock()
+
+
+class FigureCache:
+    def __init__(self, max_bytes=FIGURE_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, fig):
+        # Size is measured once, as the JSON the browser would receive
+        size = len(fig.to_json())
+        with self._lock:
+            if key in self._entries:
+                self.bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (fig, size)
+            self.bytes += size
+            # The newest entry always stays, even if it alone is over the cap
+            while self.bytes > self.max_bytes and len(self._entries) > 1:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.bytes -= evicted
+        return fig
+
+    def __len__(self):
+        return len(self._entries)
+
+
+FIGURES = FigureCache()
+
+
+def cached_figure(panel=None, cache=FIGURES):
+    # Decorator for figure builders whose arguments are the data version and
+    # widget values (all hashable); the panel id defaults to the script and
+    # function name, so two dashboards served by one process never collide
+    def decorate(build):
+        panel_id = panel or f'{build.__code__.co_filename}:{build.__name__}'
+
+        @functools.wraps(build)
+        def wrapper(*args, **kwargs):
+            key = (panel_id, args, tuple(sorted(kwargs.items())))
+            fig = cache.get(key)
+            if fig is None:
+                with BUILD_LOCK:
+                    fig = cache.put(key, build(*args, **kwargs))
+            return fig
+        return wrapper
+    return decorate
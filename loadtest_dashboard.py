@@ -0,0 +1,172 @@
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# Local load test for the Streamlit dashboards.
+#
+#   python loadtest_dashboard.py --sessions 1,4,16 --reruns 10 --output load.json
+#
+# For each session count N, a fresh process opens N simulated sessions on the
+# script (Streamlit AppTest instances sharing the process, and so its caches,
+# like sessions on one server replica). Each session makes the initial run and
+# then `--reruns` widget changes picked at random from the histogram, scatter
+# and box-plot selectboxes (WIDGETS; other scripts pass their labels with
+# --widget). Reported per N: rerun latency percentiles, throughput and the
+# process RSS (peak and at the end).
+
+SESSIONS = [1, 4, 16]
+SCRIPT = 'dashboard_british.py'
+# Widgets the simulated analysts play with (selectbox labels, per dashboard)
+WIDGETS = {
+    'dashboard_british.py': [
+        'Select a column to view its distribution:',
+        'Select X-axis variable:',
+        'Select Y-axis variable:',
+        'Select a column to view its box plot:',
+    ],
+    'british3.py': [
+        'Select distribution variable:',
+        'X-axis:',
+        'Y-axis:',
+        'Select variable for box plot:',
+    ],
+}
+RSS_SAMPLE_SECONDS = 0.05
+
+
+def rss_bytes():
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+
+class RssSampler(threading.Thread):
+    def __init__(self):
+        super().__init__(daemon=True)
+        self.peak = rss_bytes()
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.wait(RSS_SAMPLE_SECONDS):
+            self.peak = max(self.peak, rss_bytes())
+
+    def stop(self):
+        self._done.set()
+        self.join()
+        return max(self.peak, rss_bytes())
+
+
+def run_session(script, widgets, reruns, seed, timeout):
+    from streamlit.testing.v1 import AppTest
+
+    rng = random.Random(seed)
+    app = AppTest.from_file(script, default_timeout=timeout)
+    start = time.perf_counter()
+    app.run()
+    latencies = {'initial': [time.perf_counter() - start], 'rerun': []}
+    errors = [e.value for e in app.exception]
+    for _ in range(reruns):
+        boxes = [box for box in app.selectbox if box.label in widgets]
+        if not boxes:
+            # Measuring initial runs only would pass for a rerun benchmark
+            raise RuntimeError(f'no selectbox in {os.path.basename(script)} matches {widgets}; '
+                               f'labels found: {[box.label for box in app.selectbox]}')
+        box = rng.choice(boxes)
+        box.set_value(rng.choice(box.options))
+        start = time.perf_counter()
+        app.run()
+        latencies['rerun'].append(time.perf_counter() - start)
+        errors += [e.value for e in app.exception]
+    return latencies, errors
+
+
+def percentiles(values):
+    if not values:
+        return {}
+    values = np.asarray(values)
+    return {
+        'p50': round(float(np.percentile(values, 50)), 6),
+        'p90': round(float(np.percentile(values, 90)), 6),
+        'p99': round(float(np.percentile(values, 99)), 6),
+        'max': round(float(values.max()), 6),
+    }
+
+
+def run_level(script, widgets, sessions, reruns, timeout, seed):
+    sampler = RssSampler()
+    sampler.start()
+    start_rss = rss_bytes()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=sessions) as pool:
+        results = list(pool.map(lambda i: run_session(script, widgets, reruns, seed + i, timeout), range(sessions)))
+    wall = time.perf_counter() - start
+    peak_rss = sampler.stop()
+    initial = [t for latencies, _ in results for t in latencies['initial']]
+    rerun = [t for latencies, _ in results for t in latencies['rerun']]
+    return {
+        'sessions': sessions,
+        'reruns': len(rerun),
+        'wall_seconds': round(wall, 6),
+        'throughput_runs_per_second': round((len(initial) + len(rerun)) / wall, 3),
+        'initial_latency': percentiles(initial),
+        'rerun_latency': percentiles(rerun),
+        'rss_start_bytes': start_rss,
+        'rss_peak_bytes': peak_rss,
+        'rss_end_bytes': rss_bytes(),
+        'errors': sorted({str(e) for _, errors in results for e in errors}),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Concurrent-session load test for a Streamlit dashboard.')
+    parser.add_argument('--script', default=SCRIPT)
+    parser.add_argument('--sessions', default=','.join(map(str, SESSIONS)),
+                        help='comma-separated numbers of concurrent sessions')
+    parser.add_argument('--reruns', type=int, default=10, help='widget changes per session')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--timeout', type=float, default=600, help='AppTest timeout per run (seconds)')
+    parser.add_argument('--widget', action='append', dest='widgets', metavar='LABEL',
+                        help='selectbox label to change (repeatable; defaults to WIDGETS for the script)')
+    parser.add_argument('--output', help='write JSON here instead of stdout')
+    parser.add_argument('--level', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    script = os.path.abspath(args.script)
+    widgets = args.widgets or WIDGETS.get(os.path.basename(script))
+    if not widgets:
+        parser.error(f'no default widgets for {args.script}; pass its selectbox labels with --widget')
+
+    if args.level is not None:
+        # Child process: one session count, so its RSS is measured in isolation
+        # (last line of stdout; anything the app prints comes before it)
+        print(json.dumps(run_level(script, widgets, args.level, args.reruns, args.timeout, args.seed)))
+        return 0
+
+    levels = []
+    for sessions in (int(n) for n in args.sessions.split(',')):
+        child = subprocess.run([sys.executable, os.path.abspath(__file__), '--script', script,
+                                '--level', str(sessions), '--reruns', str(args.reruns),
+                                '--seed', str(args.seed), '--timeout', str(args.timeout),
+                                *(arg for label in widgets for arg in ['--widget', label])],
+                               capture_output=True, text=True)
+        if child.returncode:
+            sys.stderr.write(child.stderr)
+            return child.returncode
+        levels.append(json.loads(child.stdout.strip().splitlines()[-1]))
+    text = json.dumps({'script': args.script, 'levels': levels}, indent=1)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,189 @@
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import streamlit as st
+
+from figure_cache import FIGURES
+
+# Per-panel instrumentation for the dashboards. Each instrumented section
+# records wall time, rows processed, RSS change and (for charts) the figure
+# payload size. Off by default; with BOOKING_METRICS=1 the numbers go to
+#   - a "Panel timings" debug expander in the sidebar,
+#   - one JSON log line per section on the booking.metrics logger,
+#   - Prometheus text: BOOKING_METRICS_FILE (rewritten after each run, for a
+#     textfile collector) and/or http://<host>:BOOKING_METRICS_PORT/metrics.
+# When disabled, section() hands back a shared no-op object, so leaving the
+# calls in costs a function call per panel.
+
+METRICS_ENABLED = os.environ.get('BOOKING_METRICS') == '1'
+METRICS_FILE = os.environ.get('BOOKING_METRICS_FILE')
+METRICS_PORT = os.environ.get('BOOKING_METRICS_PORT')
+
+logger = logging.getLogger('booking.metrics')
+
+
+def rss_bytes():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:  # not Linux
+        return 0
+
+
+class _Span:
+    def __init__(self, registry, name, rows):
+        self.registry = registry
+        self.name = name
+        self.rows = rows
+        self.payload_bytes = None
+
+    def chart(self, fig, **kwargs):
+        # The same JSON Streamlit sends to the browser
+        self.payload_bytes = len(fig.to_json())
+        return st.plotly_chart(fig, **kwargs)
+
+    def __enter__(self):
+        self._rss = rss_bytes()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.registry.record(self.name, time.perf_counter() - self._start, self.rows,
+                             rss_bytes() - self._rss, self.payload_bytes)
+        return False
+
+
+class _NoopSpan:
+    rows = None
+    payload_bytes = None
+
+    def chart(self, fig, **kwargs):
+        return st.plotly_chart(fig, **kwargs)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+class PanelMetrics:
+    def __init__(self, enabled=METRICS_ENABLED):
+        self.enabled = enabled
+        self.panels = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+
+    def section(self, name, rows=None):
+        return _Span(self, name, rows) if self.enabled else _NOOP
+
+    def record(self, name, seconds, rows, memory_delta, payload_bytes):
+        with self._lock:
+            stats = self.panels.setdefault(name, {'runs': 0, 'seconds_total': 0.0})
+            stats['runs'] += 1
+            stats['seconds_total'] += seconds
+            stats.update(seconds_last=seconds, rows_last=rows, memory_delta_last=memory_delta)
+            if payload_bytes is not None:
+                stats['payload_bytes_last'] = payload_bytes
+        logger.info(json.dumps({'panel': name, 'seconds': round(seconds, 6), 'rows': rows,
+                                'memory_delta_bytes': memory_delta, 'payload_bytes': payload_bytes}))
+
+    def snapshot(self):
+        with self._lock:
+            return [{'panel': name, **stats} for name, stats in self.panels.items()]
+
+    def prometheus(self):
+        lines = []
+        metrics = [
+            ('runs', 'booking_panel_runs_total', 'counter', 'Times the panel ran'),
+            ('seconds_total', 'booking_panel_seconds_total', 'counter', 'Wall time spent in the panel'),
+            ('seconds_last', 'booking_panel_last_seconds', 'gauge', 'Wall time of the last run'),
+            ('rows_last', 'booking_panel_rows', 'gauge', 'Rows processed by the last run'),
+            ('memory_delta_last', 'booking_panel_memory_delta_bytes', 'gauge', 'RSS change over the last run'),
+            ('payload_bytes_last', 'booking_panel_payload_bytes', 'gauge', 'Figure JSON sent by the last run'),
+        ]
+        panels = self.snapshot()
+        for key, metric, kind, help_text in metrics:
+            lines += [f'# HELP {metric} {help_text}', f'# TYPE {metric} {kind}']
+            for stats in panels:
+                if stats.get(key) is not None:
+                    lines.append(f'{metric}{{panel="{stats["panel"]}"}} {stats[key]}')
+        for name, value in [('hits', FIGURES.hits), ('misses', FIGURES.misses)]:
+            lines += [f'# TYPE booking_figure_cache_{name}_total counter', f'booking_figure_cache_{name}_total {value}']
+        lines += ['# TYPE booking_figure_cache_bytes gauge', f'booking_figure_cache_bytes {FIGURES.bytes}']
+        return '\n'.join(lines) + '\n'
+
+    def flush(self, path=METRICS_FILE):
+        # Every session flushes at the end of its run; each write goes through its
+        # own temp file so concurrent flushes (threads or replicas) never collide.
+        # Metrics are best effort: a failed write is logged, never raised.
+        if not (self.enabled and path):
+            return
+        with self._flush_lock:
+            tmp_path = None
+            try:
+                fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)),
+                                                prefix=f'.{os.path.basename(path)}.')
+                with os.fdopen(fd, 'w') as f:
+                    f.write(self.prometheus())
+                # mkstemp creates 0600; the textfile collector may run as another user
+                os.chmod(tmp_path, 0o644)
+                os.replace(tmp_path, path)
+            except OSError as exc:
+                logger.warning('could not write metrics to %s: %s', path, exc)
+                if tmp_path and os.path.exists(tmp_path):
+                    os.unlink(tmp_path)
+
+    def sidebar(self):
+        if not self.enabled:
+            return
+        with st.sidebar.expander('Panel timings'):
+            st.dataframe(self.snapshot(), hide_index=True)
+
+
+METRICS = PanelMetrics()
+
+
+# --- /metrics endpoint ---
+_server_lock = threading.Lock()
+_server = None
+_server_failed = False
+
+
+def serve_metrics(port=METRICS_PORT, metrics=METRICS):
+    # Idempotent: the first caller in the process starts the server thread.
+    # If the port is taken (e.g. another replica on the node) the failure is
+    # logged once and the dashboard carries on without the endpoint.
+    global _server, _server_failed
+    if not (metrics.enabled and port):
+        return None
+    with _server_lock:
+        if _server is None and not _server_failed:
+            class Handler(BaseHTTPRequestHandler):
+                def do_GET(self):
+                    body = metrics.prometheus().encode()
+                    self.send_response(200 if self.path == '/metrics' else 404)
+                    self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                    self.end_headers()
+                    if self.path == '/metrics':
+                        self.wfile.write(body)
+
+                def log_message(self, *args):
+                    pass
+
+            try:
+                _server = ThreadingHTTPServer(('', int(port)), Handler)
+            except OSError as exc:
+                _server_failed = True
+                logger.warning('metrics endpoint not started on port %s: %s', port, exc)
+                return None
+            threading.Thread(target=_server.serve_forever, daemon=True).start()
+    return _server
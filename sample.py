@@ -3,6 +3,7 @@ import plotly.express as px
 import pandas as pd 
 import warnings
 import os
+from superstore_data import LocationIndex, OrderDateIndex, file_digest, read_superstore
 warnings.filterwarnings('ignore')
 
 st.set_page_config(page_title='Superstore!!', page_icon="📊", layout="wide")
@@ -19,6 +20,16 @@ st.markdown(
     unsafe_allow_html=True
 )
 
+# Parsed frames are cached by content hash and shared across reruns and sessions
+@st.cache_data(max_entries=8, show_spinner="Parsing file...")
+def load_upload(digest, filename, _data):
+    return read_superstore(_data, filename)
+
+@st.cache_data
+def load_default(path, mtime):
+    with open(path, 'rb') as f:
+        return read_superstore(f.read(), path, excel_engine="xlrd")
+
 # File upload
 fl = st.file_uploader("📁 Upload a file", type=["csv", "txt", "xlsx", "xls"])
 
@@ -26,21 +37,32 @@ if fl is not None:
     filename = fl.name
     st.write(f"✅ Uploaded file: {filename}")
 
-    if filename.endswith(".csv"):
-        df = pd.read_csv(fl)
-    elif filename.endswith(".txt"):
-        df = pd.read_csv(fl, delimiter="\t")
-    else:
-        df = pd.read_excel(fl, engine="openpyxl")
+    data = fl.getvalue()
+    source_key = file_digest(data)
+    df = load_upload(source_key, filename, data)
 else:
     st.write("📂 No file uploaded — loading default dataset...")
-    df = pd.read_excel("/Users/akshat17/Desktop/Samplesuperstore.xls", engine="xlrd")
+    default_path = "/Users/akshat17/Desktop/Samplesuperstore.xls"
+    mtime = os.path.getmtime(default_path)
+    df = load_default(default_path, mtime)
+    # Keyed like load_default, so editing the file in place rebuilds the indexes
+    source_key = f"{default_path}@{mtime}"
+
+# Region -> State -> City and Order Date indexes, built once per loaded file
+# (the loaded frame is sorted by Order Date)
+@st.cache_resource(max_entries=4)
+def location_index(source_key, _df):
+    return LocationIndex(_df)
+
+@st.cache_resource(max_entries=4)
+def date_index(source_key, _df):
+    return OrderDateIndex(_df)
 
-# Date conversion
-df["Order Date"] = pd.to_datetime(df["Order Date"], errors="coerce")
+index = location_index(source_key, df)
+dates = date_index(source_key, df)
 
-startdate = df["Order Date"].min()
-enddate = df["Order Date"].max()
+startdate = dates.start
+enddate = dates.end
 
 if pd.isnull(startdate) or pd.isnull(enddate):
     startdate, enddate = pd.Timestamp("2015-01-01"), pd.Timestamp("2018-12-31")
@@ -53,28 +75,21 @@ with col1:
 with col2:
     date2 = pd.to_datetime(st.date_input("End Date", enddate))
 
-df = df[(df["Order Date"] >= date1) & (df["Order Date"] <= date2)].copy()
+in_range = dates.span(date1, date2)
 
 # Sidebar filters
+# Each level's options come from the index; the filtered frame is one take at the end
 st.sidebar.header("🎚️ Choose your filter:")
 
-region = st.sidebar.multiselect("Pick your Region", df["Region"].unique())
-if not region:
-    df2 = df.copy()
-else:
-    df2 = df[df["Region"].isin(region)]
-
-state = st.sidebar.multiselect("Pick the State", df2["State"].unique())
-if not state:
-    df3 = df2.copy()
-else:
-    df3 = df2[df2["State"].isin(state)]
+region = st.sidebar.multiselect("Pick your Region", index.options("Region", span=in_range))
+state = st.sidebar.multiselect("Pick the State", index.options("State", [region], span=in_range))
+city = st.sidebar.multiselect("Pick the City", index.options("City", [region, state], span=in_range))
 
-city = st.sidebar.multiselect("Pick the City", df3["City"].unique())
-if not city:
-    df4 = df3.copy()
+if region or state or city:
+    df4 = df.take(index.take([region, state, city], span=in_range))
 else:
-    df4 = df3[df3["City"].isin(city)]
+    # Date range only: a slice of the sorted frame, no copy
+    df4 = df.iloc[in_range]
 
 st.write("✅ Data filtered successfully!")
 st.dataframe(df4.head())
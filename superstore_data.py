@@ -0,0 +1,108 @@
+import hashlib
+import io
+
+import numpy as np
+import pandas as pd
+from pandas.tseries.api import guess_datetime_format
+
+# Helpers for the Superstore EDA scripts (sample.py / sample 2.py).
+
+LOCATION_LEVELS = ['Region', 'State', 'City']
+DATE_COLUMNS = ['Order Date', 'Ship Date']
+
+
+# --- Parsing ---
+# Files are keyed by a hash of their content so the same upload is parsed
+# once, whichever session or rerun it comes from.
+def file_digest(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def parse_dates(values):
+    # Parse with one format guessed from the first value (much faster than
+    # per-element inference); fall back if that format misses any values
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values
+    present = values.dropna()
+    fmt = guess_datetime_format(str(present.iloc[0])) if len(present) else None
+    if fmt is not None:
+        parsed = pd.to_datetime(values, format=fmt, errors='coerce')
+        if parsed.notna().sum() == len(present):
+            return parsed
+    return pd.to_datetime(values, errors='coerce')
+
+
+def read_superstore(data, filename, excel_engine='openpyxl'):
+    buffer = io.BytesIO(data)
+    if filename.endswith('.csv'):
+        df = pd.read_csv(buffer)
+    elif filename.endswith('.txt'):
+        df = pd.read_csv(buffer, delimiter='\t')
+    else:
+        df = pd.read_excel(buffer, engine=excel_engine)
+    for col in DATE_COLUMNS:
+        if col in df:
+            df[col] = parse_dates(df[col])
+    # Kept in Order Date order so date ranges are contiguous slices (see OrderDateIndex)
+    if 'Order Date' in df:
+        df = df.sort_values('Order Date', kind='stable', na_position='last', ignore_index=True)
+    # Repetitive text columns (Region, Segment, Category, ...) become categoricals
+    for col in df.select_dtypes(include=['object', 'string']).columns:
+        if df[col].nunique() <= len(df) // 2:
+            df[col] = df[col].astype('category')
+    return df
+
+
+# --- Date index ---
+# Over a frame sorted by Order Date: the bounds are read once and a date range
+# becomes a slice of row positions found by binary search.
+class OrderDateIndex:
+    def __init__(self, df, column='Order Date'):
+        values = df[column].to_numpy()
+        # Unparseable dates sort last
+        self.values = values[:len(values) - np.isnat(values).sum()]
+        self.start = pd.Timestamp(self.values[0]) if len(self.values) else None
+        self.end = pd.Timestamp(self.values[-1]) if len(self.values) else None
+
+    def span(self, start, end):
+        # Rows with start <= date <= end
+        lo = np.searchsorted(self.values, np.datetime64(start), side='left')
+        hi = np.searchsorted(self.values, np.datetime64(end), side='right')
+        return slice(lo, max(lo, hi))
+
+
+# --- Location index ---
+# Region -> State -> City -> row positions, built once per loaded file. The
+# sidebar cascade reads its options and the final row set from here, so no
+# level materialises an intermediate copy of the frame.
+class LocationIndex:
+    def __init__(self, df, levels=LOCATION_LEVELS):
+        self.levels = list(levels)
+        self.rows = len(df)
+        groups = df.groupby(self.levels, sort=False, dropna=False).indices
+        self.keys = list(groups)
+        self.positions = [np.sort(rows) for rows in groups.values()]
+
+    def _leaves(self, selected, span):
+        # Leaves matching every non-empty selection, cut to the row positions in `span`
+        for key, rows in zip(self.keys, self.positions):
+            if any(values and key[i] not in values for i, values in enumerate(selected)):
+                continue
+            if span is not None:
+                rows = rows[np.searchsorted(rows, span.start):np.searchsorted(rows, span.stop)]
+            if len(rows):
+                yield key, rows
+
+    def options(self, level, selected=(), span=None):
+        # Values of `level` under the upstream selections, in order of first
+        # appearance like Series.unique()
+        depth = self.levels.index(level)
+        first = {}
+        for key, rows in self._leaves(list(selected)[:depth], span):
+            first[key[depth]] = min(first.get(key[depth], self.rows), rows[0])
+        return sorted(first, key=first.get)
+
+    def take(self, selected=(), span=None):
+        # Row positions for the selections, in frame order
+        rows = [rows for _, rows in self._leaves(list(selected), span)]
+        return np.sort(np.concatenate(rows)) if rows else np.array([], dtype=np.intp)
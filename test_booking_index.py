@@ -0,0 +1,48 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from booking_data import CSV_PATH, clean_bookings
+from booking_index import BookingIndex, FILTER_COLUMNS
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+@pytest.fixture(scope='module')
+def bookings():
+    return clean_bookings(pd.read_csv(os.path.join(HERE, CSV_PATH), encoding='latin1', nrows=5000))
+
+
+def random_filters(df, rng):
+    filters = []
+    for col in FILTER_COLUMNS:
+        if rng.random() < 0.5:
+            values = df[col].dropna().unique()
+            picked = rng.choice(values, size=min(3, len(values)), replace=False)
+            filters.append((col, tuple(picked.tolist())))
+    return tuple(filters)
+
+
+def test_mask_matches_isin(bookings):
+    index = BookingIndex(bookings)
+    rng = np.random.default_rng(0)
+    for _ in range(50):
+        filters = random_filters(bookings, rng)
+        expected = np.ones(len(bookings), dtype=bool)
+        for col, values in filters:
+            expected &= bookings[col].isin(values).to_numpy()
+        assert (index.mask(filters) == expected).all()
+
+
+def test_extended_index_matches_rebuild(bookings):
+    # Cuts off byte boundaries, so appended rows share a byte with earlier ones
+    index = None
+    for stop in [1001, 1002, 2500, 4097, len(bookings)]:
+        index = BookingIndex(bookings.iloc[:stop], base=index)
+    full = BookingIndex(bookings)
+    rng = np.random.default_rng(1)
+    for _ in range(50):
+        filters = random_filters(bookings, rng)
+        assert (index.mask(filters) == full.mask(filters)).all()
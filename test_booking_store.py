@@ -0,0 +1,97 @@
+import errno
+import os
+
+import pandas as pd
+import pytest
+
+import booking_store
+from booking_data import CSV_PATH, clean_bookings
+from booking_store import BookingStore
+
+# Ingest tests for BookingStore: a small slice of customer_booking.csv is
+# copied into a temporary directory with its own batch directory and snapshot.
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROWS = 200
+CHECK_COLUMNS = ['purchase_lead', 'length_of_stay', 'flight_hour', 'route', 'booking_origin', 'booking_complete']
+
+
+@pytest.fixture
+def extra(tmp_path, monkeypatch):
+    # Writes the export and returns the rows that follow it, for appending
+    monkeypatch.chdir(tmp_path)
+    raw = pd.read_csv(os.path.join(HERE, CSV_PATH), encoding='latin1', nrows=ROWS + 30)
+    raw.iloc[:ROWS].to_csv('bookings.csv', index=False, encoding='latin1')
+    os.makedirs('batches')
+    return raw.iloc[ROWS:]
+
+
+def make_store():
+    return BookingStore('bookings.csv', snapshot_dir='snapshot', batch_dir='batches')
+
+
+def assert_tail_matches(store, raw):
+    expected = clean_bookings(raw.copy())[CHECK_COLUMNS].astype(str).to_numpy()
+    actual = store.df[CHECK_COLUMNS].iloc[-len(raw):].astype(str).to_numpy()
+    assert (actual == expected).all()
+
+
+def test_csv_append_is_folded_in(extra):
+    store = make_store()
+    extra.iloc[:5].to_csv('bookings.csv', mode='a', header=False, index=False, encoding='latin1')
+    assert store.refresh() == 5
+    assert len(store.df) == ROWS + 5
+    assert_tail_matches(store, extra.iloc[:5])
+    assert store.refresh() == 0
+
+
+def test_batch_columns_are_matched_by_name(extra):
+    store = make_store()
+    swapped = extra.columns.tolist()
+    i, j = swapped.index('purchase_lead'), swapped.index('length_of_stay')
+    swapped[i], swapped[j] = swapped[j], swapped[i]
+    extra.iloc[:4][swapped].to_csv('batches/a.csv', index=False)
+    extra.iloc[4:8][extra.columns[::-1]].to_csv('batches/b.csv', index=False)
+    assert store.refresh() == 8
+    assert_tail_matches(store, extra.iloc[:8])
+
+
+def test_batch_with_other_columns_is_rejected(extra):
+    store = make_store()
+    version = store.version
+    extra.iloc[:4].drop(columns='route').to_csv('batches/a.csv', index=False)
+    with pytest.raises(ValueError, match='route'):
+        store.refresh()
+    assert store.version == version
+
+
+@pytest.mark.parametrize('error', [PermissionError(errno.EACCES, 'denied'),
+                                   OSError(errno.EROFS, 'read-only file system')])
+def test_read_only_snapshot_falls_back_to_parsing(extra, monkeypatch, caplog, error):
+    def sync_snapshot(*args):
+        raise error
+
+    monkeypatch.setattr(booking_store, 'sync_snapshot', sync_snapshot)
+    with caplog.at_level('WARNING', logger='booking.store'):
+        store = make_store()
+        store.refresh()
+    assert store.version.startswith('csv-')
+    assert len(store.df) == ROWS
+    assert len(caplog.records) == 1
+
+
+def test_other_snapshot_errors_are_raised(extra, monkeypatch):
+    def sync_snapshot(*args):
+        raise OSError(errno.ENOSPC, 'no space left on device')
+
+    monkeypatch.setattr(booking_store, 'sync_snapshot', sync_snapshot)
+    with pytest.raises(OSError, match='no space'):
+        make_store()
+
+
+def test_extends_follows_appends_within_a_generation():
+    assert BookingStore.extends('abc-1', 'abc-3')
+    assert BookingStore.extends('abc-2', 'abc-2')
+    assert not BookingStore.extends('abc-3', 'abc-1')
+    assert not BookingStore.extends('abc-1', 'def-2')
+    assert not BookingStore.extends(None, 'abc-1')
+    assert not BookingStore.extends('csv-10-5', 'csv-10-6')
@@ -0,0 +1,109 @@
+import os
+import shutil
+import tempfile
+import urllib.request
+
+import numpy as np
+import pandas as pd
+
+# Loader for the Uber pickups demo (uber_pickups.py / uber_pickups 2.py).
+# The remote file is downloaded once into UBER_DATA_PATH and parsed from there;
+# point UBER_DATA_PATH at a local copy (or stand-in) to run offline.
+
+DATE_COLUMN = 'date/time'
+DATA_URL = ('https://s3-us-west-2.amazonaws.com/'
+            'streamlit-demo-data/uber-raw-data-sep14.csv.gz')
+UBER_DATA_PATH = os.environ.get('UBER_DATA_PATH', 'uber-raw-data-sep14.csv.gz')
+# e.g. 9/1/2014 0:01:00
+DATE_FORMAT = '%m/%d/%Y %H:%M:%S'
+CHUNK_ROWS = 100_000
+DTYPES = {'Date/Time': str, 'Lat': 'float64', 'Lon': 'float64', 'Base': str}
+
+
+def fetch_pickups(path=UBER_DATA_PATH, url=DATA_URL):
+    # Download to a temporary file first so an interrupted transfer never
+    # leaves a truncated file at `path`
+    if os.path.exists(path):
+        return path
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    with urllib.request.urlopen(url) as response, \
+            tempfile.NamedTemporaryFile(dir=directory, delete=False) as tmp:
+        try:
+            shutil.copyfileobj(response, tmp)
+        except BaseException:
+            os.unlink(tmp.name)
+            raise
+    os.replace(tmp.name, path)
+    return path
+
+
+def read_pickups(path=UBER_DATA_PATH, nrows=None, chunksize=CHUNK_ROWS):
+    chunks = []
+    reader = pd.read_csv(path, nrows=nrows, chunksize=chunksize, dtype=DTYPES)
+    for chunk in reader:
+        chunk.columns = chunk.columns.str.lower()
+        chunk[DATE_COLUMN] = pd.to_datetime(chunk[DATE_COLUMN], format=DATE_FORMAT)
+        chunk['hour'] = chunk[DATE_COLUMN].dt.hour.astype('int8')
+        chunks.append(chunk)
+    data = pd.concat(chunks, ignore_index=True)
+    data['base'] = data['base'].astype('category')
+    return data
+
+
+def load_pickups(nrows=None, path=UBER_DATA_PATH):
+    return read_pickups(fetch_pickups(path), nrows=nrows)
+
+
+# --- Hour index ---
+# Row positions of each pickup hour, built once per loaded frame: the hourly
+# histogram is the run lengths and an hour's pickups are one slice + take.
+class HourIndex:
+    def __init__(self, data):
+        self.order = np.argsort(data['hour'].to_numpy(), kind='stable')
+        self.bounds = np.searchsorted(data['hour'].to_numpy()[self.order], np.arange(25))
+        self.counts = np.diff(self.bounds)
+
+    def rows(self, hour):
+        return self.order[self.bounds[hour]:self.bounds[hour + 1]]
+
+
+# --- Map grid ---
+# Above MAP_POINT_LIMIT pickups the maps send one circle per occupied grid cell
+# instead of one per pickup, so the payload follows the number of cells.
+MAP_POINT_LIMIT = 5000
+# Cells along the longer side of the mapped area
+GRID_STEPS = 60
+METERS_PER_DEGREE = 111_000
+
+
+def pickup_extent(data):
+    return (float(data['lat'].min()), float(data['lat'].max()),
+            float(data['lon'].min()), float(data['lon'].max()))
+
+
+def within(data, bounds):
+    lat0, lat1, lon0, lon1 = bounds
+    lat = data['lat'].to_numpy()
+    lon = data['lon'].to_numpy()
+    return data[(lat >= lat0) & (lat <= lat1) & (lon >= lon0) & (lon <= lon1)]
+
+
+def grid_cells(data, bounds, steps=GRID_STEPS):
+    # Square cells sized so the longer side of `bounds` spans `steps` cells;
+    # shade encodes the pickup count (log scale, the busiest cells dominate otherwise)
+    lat0, lat1, lon0, lon1 = bounds
+    cell = max(lat1 - lat0, lon1 - lon0) / steps or 1e-3
+    nx = int((lon1 - lon0) / cell) + 1
+    iy = ((data['lat'].to_numpy() - lat0) / cell).astype(np.int64)
+    ix = ((data['lon'].to_numpy() - lon0) / cell).astype(np.int64)
+    keys, counts = np.unique(iy * nx + ix, return_counts=True)
+    cy, cx = np.divmod(keys, nx)
+    alpha = (40 + 215 * np.log1p(counts) / np.log1p(counts.max())).astype(int) if len(counts) else []
+    return pd.DataFrame({
+        'lat': np.round(lat0 + (cy + 0.5) * cell, 5),
+        'lon': np.round(lon0 + (cx + 0.5) * cell, 5),
+        'count': counts,
+        'radius': round(cell * METERS_PER_DEGREE / 2, 1),
+        'color': [f'#ff0050{a:02x}' for a in alpha],
+    })
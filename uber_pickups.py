@@ -1,41 +1,66 @@
 import streamlit as st 
-import numpy as np 
-import pandas as pd 
+import os
+from uber_data import (load_pickups, HourIndex, MAP_POINT_LIMIT, pickup_extent, within,
+    grid_cells)
 st.title('Uber pickups in New York City')
 #to run:  in terminal 
-DATE_COLUMN = 'date/time'
-DATA_URL = ('https://s3-us-west-2.amazonaws.com/'
-         'streamlit-demo-data/uber-raw-data-sep14.csv.gz')
+# UBER_DATA_PATH sets where the dataset is cached locally (see uber_data.py)
 
+# Downloaded once to disk, parsed once per nrows; reruns reuse the parsed frame
+@st.cache_data
 def load_data(nrows): 
-    data = pd.read_csv(DATA_URL, nrows=nrows)
-    lowercase = lambda x: str(x).lower()
-    data.rename(lowercase, axis = 'columns', inplace = True)
-    data[DATE_COLUMN] = pd.to_datetime(data[DATE_COLUMN])
-    return data
+    return load_pickups(nrows)
+
+# Per-hour row positions, built once per loaded frame
+@st.cache_resource
+def hour_index(nrows):
+    return HourIndex(load_data(nrows))
+
+# Map layer for one hour (None = all) and area: raw points up to MAP_POINT_LIMIT
+# pickups, otherwise grid cells shaded by count. Cached per hour and area.
+@st.cache_data(max_entries=64)
+def map_layer(nrows, hour, bounds):
+    data = load_data(nrows)
+    if hour is not None:
+        data = data.take(hour_index(nrows).rows(hour))
+    data = within(data, bounds)
+    if len(data) <= MAP_POINT_LIMIT:
+        return data[['lat', 'lon']]
+    return grid_cells(data, bounds)
+
+def show_map(layer):
+    if 'count' in layer:
+        st.map(layer, size='radius', color='color')
+    else:
+        st.map(layer)
+
+# Rows to load (UBER_ROWS=0 loads the full month)
+NROWS = int(os.environ.get('UBER_ROWS', 10000)) or None
 
 #create a text element let the reader know the data is loaded
 data_load_state = st.text('Loading data...')
-data = load_data(10000)
+data = load_data(NROWS)
+index = hour_index(NROWS)
 data_load_state.text("Done! (using st.cache_data)") 
 
-#@st.cache_data
-# def load_data(nrows):
-#     data_load_state.text("Done! (using st.cache_data)")
-
 if st.checkbox('Show raw data'):
     st.subheader('Raw data')
     st.write(data)
 #histogram 
 st.subheader('Number of pickups by hour')
-hist_values = np.histogram( data[DATE_COLUMN].dt.hour, bins = 24, range=(0,24)) [0]
+hist_values = index.counts
 st.bar_chart(hist_values)
 
 #plot data on map 
 st.subheader('map of all pickups')
-st.map(data)
+# Narrowing the area switches the maps to raw points once few enough pickups remain
+extent = pickup_extent(data)
+with st.expander('Zoom to area'):
+    lat_range = st.slider('latitude', extent[0], extent[1], (extent[0], extent[1]), step=0.001, format='%.3f')
+    lon_range = st.slider('longitude', extent[2], extent[3], (extent[2], extent[3]), step=0.001, format='%.3f')
+bounds = (*lat_range, *lon_range)
+show_map(map_layer(NROWS, None, bounds))
 
-hour_to_filter = 17 
-filtered_data = data[data[DATE_COLUMN].dt.hour == hour_to_filter]
+hour_to_filter = st.slider('hour', 0, 23, 17)
 st.subheader(f'Map of all pickups at {hour_to_filter}: 00')
-st.map(filtered_data)
+show_map(map_layer(NROWS, hour_to_filter, bounds))